@@ -66,11 +66,15 @@ setuptools.setup(
     extras_require={
         ':sys_platform == "win32"': [
             'pyreadline>=2.1'                     # BSD
+        ],
+        'watch': [
+            'watchdog>=0.8'                       # Apache 2.0
         ]
     },
     entry_points='''
         [console_scripts]
         zazu=zazu.cli:cli
+        zazu-hook=zazu.daemon_client:main
         ''',
     setup_requires=[] + pytest_runner,
     tests_require=['pytest',
@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks for the zazu style pipeline.
+
+Generates synthetic repositories and times the stages of zazu style on them:
+    - match: PathMatcher against plain fnmatch over every path in the repo
+    - scan: classify_tree walking the working tree for two stylers
+    - tracked: listing the style candidates from the git index
+    - dispatch: styling every file with an in-process stub styler, serially and through zazu.util.dispatch
+    - staged: reading every staged file through StagedFileReader
+    - cache: styling every file with a cold, warm and stat-indexed StyleCache
+
+Usage:
+    python tests/bench/bench_style.py --files 1000,10000 --output results.json
+    python tests/bench/bench_style.py --files 1000 --compare results.json
+
+Results are written as JSON so that runs from different commits can be compared with --compare.
+"""
+import argparse
+import fnmatch
+import functools
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+import zazu.git_helper  # noqa: E402
+import zazu.style  # noqa: E402
+import zazu.style_cache  # noqa: E402
+import zazu.styler  # noqa: E402
+import zazu.util  # noqa: E402
+
+__author__ = "Nicholas Wiles"
+__copyright__ = "Copyright 2017"
+
+EXTENSIONS = ['.py', '.cpp', '.h', '.hpp', '.c', '.cc', '.txt', '.md', '.js', '.proto', '.java', '.o']
+DIRECTORIES = ['src', 'include', 'test', 'build', 'dependency', 'lib', 'app', 'vendor', 'docs', 'tools']
+PATTERNS = [(['*.py'], ['build', 'dependency', 'dependencies', 'vendor/*']),
+            (['*.c', '*.cc', '*.cpp', '*.h', '*.hpp', '*.java', '*.js', '*.proto'], ['build', 'dependency', 'dependencies'])]
+
+
+class StubStyler(zazu.styler.Styler):
+    """Styler that returns its input, so only zazu's own overhead is measured."""
+
+    def style_string(self, string):
+        """Return string unchanged."""
+        return string
+
+    @staticmethod
+    def type():
+        """Return the name of this Styler."""
+        return 'stub'
+
+
+def git(root, *args):
+    """Run a git command in root."""
+    with open(os.devnull, 'w') as devnull:
+        subprocess.check_call(['git'] + list(args), cwd=root, stdout=devnull)
+
+
+def generate_repo(root, count, depth, seed=1):
+    """Create a git repo with count files spread over a tree up to depth directories deep, and stage them all."""
+    rng = random.Random(seed)
+    paths = []
+    for n in range(count):
+        dirs = [rng.choice(DIRECTORIES) + (str(rng.randint(0, 3)) if i else '') for i in range(rng.randint(0, depth))]
+        path = os.path.join(*(dirs + ['f{}{}'.format(n, rng.choice(EXTENSIONS))]))
+        paths.append(path)
+        full_path = os.path.join(root, path)
+        try:
+            os.makedirs(os.path.dirname(full_path))
+        except OSError:
+            pass
+        with open(full_path, 'wb') as f:
+            f.write(b''.join(b'line %d of file %d\n' % (i, n) for i in range(rng.randint(1, 200))))
+    git(root, 'init', '-q')
+    git(root, 'add', '-A')
+    return paths
+
+
+def timed(fn, repeat):
+    """Run fn repeat times and return the fastest time in seconds, along with the result of the last run."""
+    best = None
+    for _ in range(repeat):
+        start = time.time()
+        result = fn()
+        elapsed = time.time() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def peak_rss_kb():
+    """Return the peak resident set size of this process in KiB, or None where it can't be measured."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS reports bytes, Linux reports KiB.
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+def bench_repo(root, paths, repeat, jobs):
+    """Run every benchmark against a generated repo and return a dict of results keyed by benchmark name."""
+    results = {}
+
+    def record(name, seconds, items):
+        results[name] = {'seconds': seconds, 'items': items, 'us_per_item': seconds * 1e6 / max(items, 1)}
+
+    def fnmatch_all():
+        return [p for p in paths if any(fnmatch.fnmatch(p, i) for i in PATTERNS[1][0]) and
+                all(not fnmatch.fnmatch(p, e) for e in PATTERNS[1][1])]
+    seconds, expected = timed(fnmatch_all, repeat)
+    record('match.fnmatch', seconds, len(paths))
+    matcher = zazu.util.PathMatcher(*PATTERNS[1])
+    seconds, matched = timed(lambda: [p for p in paths if matcher.match_file(p)], repeat)
+    assert matched == expected, 'PathMatcher disagrees with fnmatch'
+    record('match.path_matcher', seconds, len(paths))
+
+    with zazu.util.cd(root):
+        seconds, styler_files = timed(lambda: zazu.util.classify_tree(root, PATTERNS, exclude_hidden=True), repeat)
+        files = sorted(styler_files[1])
+        record('scan.classify_tree', seconds, len(paths))
+        seconds, tracked = timed(lambda: zazu.git_helper.get_tracked_files(root), repeat)
+        record('tracked.get_tracked_files', seconds, len(tracked))
+
+        styler = StubStyler()
+        seconds, _ = timed(lambda: [zazu.style.style_file(styler, f, zazu.style.read_file, None) for f in files], repeat)
+        record('dispatch.serial', seconds, len(files))
+
+        def dispatched():
+            work = (functools.partial(zazu.style.style_file, styler, f, zazu.style.read_file, None) for f in files)
+            return list(zazu.util.dispatch(work, max_workers=jobs))
+        seconds, _ = timed(dispatched, repeat)
+        record('dispatch.threads', seconds, len(files))
+
+        def read_staged():
+            with zazu.git_helper.StagedFileReader(root) as reader:
+                return sum(len(reader.read(f)) for f in files)
+        seconds, size = timed(read_staged, repeat)
+        record('staged.cat_file_batch', seconds, len(files))
+        results['staged.cat_file_batch']['mb_per_second'] = size / 1e6 / max(seconds, 1e-9)
+
+        cache_path = os.path.join(tempfile.mkdtemp(), 'style_cache.json')
+
+        def cached(use_stat):
+            cache = zazu.style_cache.StyleCache(cache_path, max_entries=len(files))
+            for f in files:
+                zazu.style.style_file(styler, f, zazu.style.read_file, None, cache, use_stat)
+            cache.save()
+        seconds, _ = timed(lambda: cached(False), 1)
+        record('cache.cold', seconds, len(files))
+        seconds, _ = timed(lambda: cached(False), repeat)
+        record('cache.warm', seconds, len(files))
+        cached(True)
+        seconds, _ = timed(lambda: cached(True), repeat)
+        record('cache.stat', seconds, len(files))
+        shutil.rmtree(os.path.dirname(cache_path))
+    return results
+
+
+def compare(current, previous):
+    """Print the ratio of each benchmark's time to the same benchmark in a previous run."""
+    print('{:>8} {:<28} {:>10} {:>10} {:>7}'.format('files', 'benchmark', 'before', 'after', 'ratio'))
+    for count, results in sorted(current['runs'].items(), key=lambda r: int(r[0])):
+        for name, result in sorted(results.items()):
+            before = previous['runs'].get(count, {}).get(name)
+            if before is None:
+                continue
+            ratio = result['seconds'] / max(before['seconds'], 1e-9)
+            print('{:>8} {:<28} {:>9.3f}s {:>9.3f}s {:>6.2f}x'.format(count, name, before['seconds'], result['seconds'], ratio))
+
+
+def main():
+    """Run the benchmarks from the command line."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--files', default='1000', help='comma separated repo sizes to generate (default: %(default)s)')
+    parser.add_argument('--depth', type=int, default=6, help='maximum directory depth (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per benchmark, the fastest is kept (default: %(default)s)')
+    parser.add_argument('--jobs', type=int, default=zazu.util.cpu_count(), help='dispatch worker threads')
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--compare', help='compare the results against a JSON file written by a previous run')
+    args = parser.parse_args()
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)))
+        commit = commit.decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    current = {'commit': commit, 'python': platform.python_version(), 'platform': platform.platform(), 'jobs': args.jobs,
+               'runs': {}}
+    for count in [int(c) for c in args.files.split(',')]:
+        root = tempfile.mkdtemp()
+        try:
+            paths = generate_repo(root, count, args.depth)
+            current['runs'][str(count)] = bench_repo(root, paths, args.repeat, args.jobs)
+        finally:
+            shutil.rmtree(root)
+        for name, result in sorted(current['runs'][str(count)].items()):
+            print('{:>8} {:<28} {:>9.3f}s {:>9.1f}us/item'.format(count, name, result['seconds'], result['us_per_item']))
+    current['peak_rss_kb'] = peak_rss_kb()
+    print('peak RSS: {} KiB'.format(current['peak_rss_kb']))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(current, f, indent=2, sort_keys=True)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(current, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,16 @@
 # -*- coding: utf-8 -*-
 import click.testing
+import subprocess
+import sys
+import time
 import zazu.cli
 
 __author__ = "Nicholas Wiles"
 __copyright__ = "Copyright 2016"
 
+# Generous enough for a slow CI machine, a regression to importing every subcommand at startup takes several times this.
+STARTUP_BUDGET_SECONDS = 1.0
+
 
 def test_cli():
     runner = click.testing.CliRunner()
@@ -12,8 +18,36 @@ def test_cli():
     assert result.exit_code == 0
 
 
+def test_lazy_command_short_help():
+    ctx = click.Context(zazu.cli.cli)
+    for name, (_, _, short_help) in zazu.cli.cli.lazy_commands.items():
+        command = zazu.cli.cli.get_command(ctx, name)
+        assert command.short_help == short_help
+        assert command.get_short_help_str() == short_help
+
+
 def test_init(mocker):
     cli_mock = mocker.patch('zazu.cli.cli')
     mocker.patch.object(zazu.cli, "__name__", "__main__")
     zazu.cli.init()
     assert cli_mock.call_count == 1
+
+
+def test_cli_startup():
+    # "zazu style" runs in the pre-commit hook, so starting zazu must not import the other subcommands or interactive
+    # dependencies.
+    code = ('import sys, zazu.cli\n'
+            'try:\n'
+            '    zazu.cli.cli(["--help"])\n'
+            'except SystemExit:\n'
+            '    sys.stderr.write(" ".join(sys.modules))\n')
+    start = time.time()
+    process = subprocess.Popen([sys.executable, '-c', code], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = process.communicate()
+    elapsed = time.time() - start
+    assert b'Commands:' in stdout
+    modules = stderr.decode('utf-8').split()
+    for module in ['readline', 'zazu.build', 'zazu.cmake_helper', 'zazu.daemon', 'zazu.dev.commands', 'zazu.github_helper',
+                   'zazu.repo.commands', 'zazu.style', 'zazu.upgrade']:
+        assert module not in modules
+    assert elapsed < STARTUP_BUDGET_SECONDS
@@ -121,3 +121,54 @@ def test_valid_code_reviewer():
     uut = zazu.config.Config('')
     uut._project_config = {'codeReviewer': {'type': 'github'}}
     assert uut.code_reviewer()
+
+
+def test_load_plugins_once(monkeypatch):
+    import straight.plugin
+    import zazu.styler
+    monkeypatch.setattr(zazu.config, '_plugins', {})
+    loads = []
+    load = straight.plugin.load
+
+    def counting_load(*args, **kwargs):
+        loads.append(args)
+        return load(*args, **kwargs)
+    monkeypatch.setattr(straight.plugin, 'load', counting_load)
+    stylers = zazu.config.load_plugins(zazu.styler.Styler)
+    assert 'autopep8' in [p.type() for p in stylers]
+    assert zazu.config.load_plugins(zazu.styler.Styler) is stylers
+    assert len(loads) == 1
+    zazu.config.load_plugins(zazu.code_reviewer.CodeReviewer)
+    assert len(loads) == 2
+
+
+def test_config_cache(repo_with_jira, monkeypatch):
+    root = repo_with_jira.working_tree_dir
+    file_name = os.path.join(root, 'zazu.yaml')
+    cache_path = zazu.config.config_cache_path(repo_with_jira)
+    os.utime(file_name, (1000, 1000))
+    assert zazu.config.Config(root).project_config()['issueTracker']['project'] == 'TEST'
+    assert os.path.exists(cache_path)
+    parsed = []
+    parse = zazu.config.parse_yaml_file
+
+    def counting_parse(file_name):
+        parsed.append(file_name)
+        return parse(file_name)
+    monkeypatch.setattr(zazu.config, 'parse_yaml_file', counting_parse)
+    assert zazu.config.Config(root).project_config()['issueTracker']['project'] == 'TEST'
+    assert not parsed
+    with open(file_name, 'w') as file:
+        file.write(yaml.dump({'issueTracker': {'type': 'Jira', 'project': 'NEW'}}))
+    os.utime(file_name, (2000, 2000))
+    assert zazu.config.Config(root).project_config()['issueTracker']['project'] == 'NEW'
+    assert parsed == [file_name]
+    # A change written after the cache can't be trusted to have changed the mtime.
+    os.utime(file_name, (2000, 2000))
+    os.utime(cache_path, (2000, 2000))
+    assert zazu.config.Config(root).project_config()['issueTracker']['project'] == 'NEW'
+    assert len(parsed) == 2
+    with open(cache_path, 'wb') as file:
+        file.write(b'garbage')
+    assert zazu.config.Config(root).project_config()['issueTracker']['project'] == 'NEW'
+    assert len(parsed) == 3
@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+import click.testing
+import os
+import pytest
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import yaml
+import zazu.cli
+import zazu.config
+import zazu.daemon
+import zazu.daemon_client
+import zazu.util
+
+__author__ = "Nicholas Wiles"
+__copyright__ = "Copyright 2017"
+
+requires_unix_sockets = pytest.mark.skipif(not hasattr(socket, 'AF_UNIX'), reason='requires Unix domain sockets')
+
+
+@pytest.fixture()
+def repo_with_style_errors(git_repo, monkeypatch):
+    # The daemon and client processes import zazu from this tree.
+    root = os.path.dirname(os.path.dirname(os.path.abspath(zazu.__file__)))
+    monkeypatch.setenv('PYTHONPATH', os.pathsep.join([root] + [p for p in [os.environ.get('PYTHONPATH')] if p]))
+    dir = git_repo.working_tree_dir
+    with zazu.util.cd(dir):
+        with open('zazu.yaml', 'a') as file:
+            file.write(yaml.dump({'style': {'autopep8': {}}}))
+        with open('bad.py', 'w') as file:
+            file.write('def  foo():\n  return 1\n')
+        git_repo.index.add(['zazu.yaml', 'bad.py'])
+    return git_repo
+
+
+def run_client(*args):
+    process = subprocess.Popen([sys.executable, '-m', 'zazu.daemon_client'] + list(args),
+                               stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    stdout, stderr = process.communicate()
+    return process.returncode, stdout, stderr
+
+
+@requires_unix_sockets
+def test_socket_path():
+    assert zazu.daemon_client.socket_path('/repo/.git') == os.path.join(os.path.realpath('/repo/.git'), 'zazu', 'daemon.sock')
+    long_path = zazu.daemon_client.socket_path('/' + 'a' * 200)
+    assert os.path.dirname(long_path) == zazu.daemon_client.private_temp_dir()
+    assert stat.S_IMODE(os.stat(os.path.dirname(long_path)).st_mode) == 0o700
+    assert long_path == zazu.daemon_client.socket_path('/' + 'a' * 200)
+    assert long_path != zazu.daemon_client.socket_path('/' + 'b' * 200)
+
+
+@requires_unix_sockets
+def test_private_temp_dir(tmp_dir, monkeypatch):
+    monkeypatch.setattr(tempfile, 'tempdir', tmp_dir)
+    path = zazu.daemon_client.private_temp_dir()
+    assert path == zazu.daemon_client.private_temp_dir()
+    os.chmod(path, 0o777)
+    with pytest.raises(OSError):
+        zazu.daemon_client.private_temp_dir()
+    assert zazu.daemon_client.connect('/' + 'a' * 200) is None
+
+
+@requires_unix_sockets
+def test_connect_other_user(tmp_dir, monkeypatch):
+    path = os.path.join(tmp_dir, 'test.sock')
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        server.bind(path)
+        server.listen(1)
+        sock = zazu.daemon_client.connect_path(path)
+        assert sock is not None
+        sock.close()
+        # A socket another user bound could send any output and exit code.
+        uid = os.getuid()
+        monkeypatch.setattr(os, 'getuid', lambda: uid + 1)
+        assert zazu.daemon_client.connect_path(path) is None
+    finally:
+        server.close()
+
+
+def test_cli_keeps_obj(git_repo):
+    config = zazu.config.Config(git_repo.working_tree_dir)
+    config._project_config = {'style': {}}
+    runner = click.testing.CliRunner()
+    result = runner.invoke(zazu.cli.cli, ['style', '--check'], obj=config)
+    assert result.exit_code == 0
+    assert config._stylers == []
+
+
+def test_frame_writer():
+    client, server = socket.socketpair()
+    try:
+        lock = threading.Lock()
+        out = zazu.daemon.FrameWriter(server, zazu.daemon_client.OUT, True, lock)
+        err = zazu.daemon.FrameWriter(server, zazu.daemon_client.ERR, False, lock)
+        click.echo(u'caf\xe9', file=out)
+        click.echo(b'\xff', file=out)
+        click.secho('failed', fg='red', file=err)
+        server.close()
+        frames = list(zazu.daemon_client.read_frames(client))
+    finally:
+        client.close()
+    assert b''.join(p for c, p in frames if c == zazu.daemon_client.OUT) == u'caf\xe9\n'.encode('utf-8') + b'\xff\n'
+    # Colors are only sent to terminals.
+    assert b''.join(p for c, p in frames if c == zazu.daemon_client.ERR) == b'failed\n'
+
+
+@requires_unix_sockets
+def test_daemon(repo_with_style_errors):
+    dir = repo_with_style_errors.working_tree_dir
+    with zazu.util.cd(dir):
+        # Without a daemon the client runs the command itself.
+        exit_code, stdout, _ = run_client('style', '--check', '--cached', '-v')
+        assert exit_code
+        assert b'bad.py' in stdout
+        runner = click.testing.CliRunner()
+        result = runner.invoke(zazu.cli.cli, ['daemon', 'status'])
+        assert result.exit_code == 1
+        result = runner.invoke(zazu.cli.cli, ['daemon', 'start', '--idle-timeout', '60'])
+        assert result.exit_code == 0, result.output
+        try:
+            assert 'already running' in runner.invoke(zazu.cli.cli, ['daemon', 'start']).output
+            assert runner.invoke(zazu.cli.cli, ['daemon', 'status']).exit_code == 0
+            exit_code, stdout, stderr = run_client('style', '--check', '--cached', '-v')
+            assert exit_code, stderr
+            assert b'bad.py' in stdout
+            assert b'1 files with violations in 1 files' in stdout
+            exit_code, stdout, _ = run_client('style', '--cached')
+            assert exit_code == 0
+            exit_code, _, _ = run_client('style', '--check', '--cached')
+            assert exit_code == 0
+            # Errors are sent to the client's stderr.
+            exit_code, _, stderr = run_client('style', '--since', 'no-such-ref')
+            assert exit_code == 1
+            assert b'no-such-ref' in stderr
+        finally:
+            result = runner.invoke(zazu.cli.cli, ['daemon', 'stop'])
+        assert result.exit_code == 0
+        assert 'stopped' in result.output
+        assert runner.invoke(zazu.cli.cli, ['daemon', 'status']).exit_code == 1
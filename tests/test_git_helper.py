@@ -48,3 +48,67 @@ def test_get_merged_branches(git_repo):
 def test_git_filter_undeletable():
     some_branches = ['-', 'master', 'develop', '*current', 'HEAD', 'origin/HEAD', 'feature/foo']
     assert zazu.git_helper.filter_undeletable(some_branches) == ['feature/foo']
+
+
+def test_tracked_files(git_repo):
+    dir = git_repo.working_tree_dir
+    assert zazu.git_helper.get_tracked_files(dir) == ['README.md']
+    os.mkdir(os.path.join(dir, 'sub'))
+    for name in ['sub/tracked.py', 'untracked.py', 'deleted.py']:
+        with open(os.path.join(dir, name), 'w') as file:
+            file.write('hello')
+    git_repo.index.add([os.path.join(dir, 'sub/tracked.py'), os.path.join(dir, 'deleted.py')])
+    os.remove(os.path.join(dir, 'deleted.py'))
+    assert zazu.git_helper.get_tracked_files(dir) == ['README.md', 'sub/tracked.py']
+    assert zazu.git_helper.get_tracked_files(dir, ['sub']) == ['sub/tracked.py']
+
+
+def test_changed_files(git_repo):
+    dir = git_repo.working_tree_dir
+    git_repo.git.branch('base')
+    assert zazu.git_helper.get_changed_files(git_repo, 'base') == []
+    os.mkdir(os.path.join(dir, 'sub'))
+    for name in ['sub/changed.py', 'other.py']:
+        with open(os.path.join(dir, name), 'w') as file:
+            file.write('hello')
+        git_repo.index.add([os.path.join(dir, name)])
+    git_repo.index.commit('add files')
+    assert zazu.git_helper.get_changed_files(git_repo, 'base') == ['other.py', 'sub/changed.py']
+    assert zazu.git_helper.get_changed_files(git_repo, 'base', ['sub']) == ['sub/changed.py']
+
+
+def test_staged_file_reader(git_repo):
+    dir = git_repo.working_tree_dir
+    test_file = os.path.join(dir, 'test')
+    with open(test_file, 'w') as file:
+        file.write('staged\n')
+    git_repo.index.add([test_file])
+    with open(test_file, 'w') as file:
+        file.write('unstaged\n')
+    assert 'test' in zazu.git_helper.get_staged_object_ids(dir)
+    with zazu.git_helper.StagedFileReader(dir) as uut:
+        assert uut.read('test') == b'staged\n'
+        assert uut.read('README.md') == b''
+        assert uut.read('test') == b'staged\n'
+
+
+def test_staged_line_ranges(git_repo):
+    dir = git_repo.working_tree_dir
+    lines = ['line {}\n'.format(i) for i in range(1, 11)]
+    with open(os.path.join(dir, 'a.txt'), 'w') as file:
+        file.writelines(lines)
+    with open(os.path.join(dir, 'b.txt'), 'w') as file:
+        file.writelines(['-- comment\n'] + lines)
+    git_repo.index.add(['a.txt', 'b.txt'])
+    git_repo.index.commit('lines')
+    # Change lines 2 and 3, insert a line after 6 and change the last line.
+    changed = lines[:1] + ['two\n', 'three\n'] + lines[3:6] + ['new\n'] + lines[6:9] + ['ten']
+    with open(os.path.join(dir, 'a.txt'), 'w') as file:
+        file.writelines(changed)
+    # Only remove lines, one of which looks like a diff header once it is prefixed with "-".
+    with open(os.path.join(dir, 'b.txt'), 'w') as file:
+        file.writelines(lines[1:])
+    with open(os.path.join(dir, 'c.txt'), 'w') as file:
+        file.write('new file\n')
+    git_repo.index.add(['a.txt', 'b.txt', 'c.txt'])
+    assert zazu.git_helper.get_staged_line_ranges(dir) == {'a.txt': [(2, 3), (7, 7), (11, 11)], 'b.txt': [], 'c.txt': None}
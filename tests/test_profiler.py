@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import json
+import os
+import pytest
+import zazu.profiler
+
+__author__ = "Nicholas Wiles"
+__copyright__ = "Copyright 2017"
+
+
+@pytest.fixture()
+def profiler():
+    zazu.profiler.enable()
+    yield zazu.profiler
+    zazu.profiler.disable()
+
+
+def test_span_disabled():
+    assert not zazu.profiler.enabled()
+    with zazu.profiler.span('foo'):
+        pass
+    assert zazu.profiler.spans() == []
+
+
+def test_span(profiler):
+    with profiler.span('foo', bar=1):
+        pass
+    with profiler.span('foo'):
+        pass
+    with pytest.raises(ValueError):
+        with profiler.span('baz'):
+            raise ValueError()
+    spans = profiler.spans()
+    assert [s.name for s in spans] == ['foo', 'foo', 'baz']
+    assert spans[0].args == {'bar': 1}
+    rows = {row[0]: row for row in profiler.summary()}
+    assert rows['foo'][1] == 2
+    assert rows['baz'][1] == 1
+    assert 'foo' in profiler.format_summary()
+
+
+def test_profiled(profiler):
+    @profiler.profiled('decorated')
+    def foo(x):
+        return x + 1
+    assert foo(1) == 2
+    assert [s.name for s in profiler.spans()] == ['decorated']
+
+
+def test_subprocess_span(profiler):
+    with profiler.subprocess_span(['/usr/bin/git', 'ls-files', '-z']):
+        pass
+    with profiler.subprocess_span(['autopep8', '--max-line-length=150', '-']):
+        pass
+    with profiler.subprocess_span('make all'):
+        pass
+    spans = profiler.spans()
+    assert [s.name for s in spans] == ['subprocess git ls-files', 'subprocess autopep8', 'subprocess shell']
+    assert spans[0].args == {'argv': ['/usr/bin/git', 'ls-files', '-z']}
+
+
+def test_write_chrome_trace(profiler, tmp_dir):
+    with profiler.span('foo', 'cat', bar='baz'):
+        pass
+    path = os.path.join(tmp_dir, 'trace.json')
+    profiler.write_chrome_trace(path)
+    with open(path) as f:
+        events = json.load(f)['traceEvents']
+    assert len(events) == 1
+    assert events[0]['name'] == 'foo'
+    assert events[0]['cat'] == 'cat'
+    assert events[0]['ph'] == 'X'
+    assert events[0]['args'] == {'bar': 'baz'}
@@ -1,10 +1,25 @@
 # -*- coding: utf-8 -*-
+import autopep8
 import click
+import concurrent.futures
 import distutils.spawn
+import json
+import os
 import pytest
+import sys
+import threading
+import time
+import yaml
 import zazu.cli
+import zazu.config
+import zazu.plugins.astyle_styler
+import zazu.plugins.autopep8_styler
+import zazu.plugins.clang_format_styler
 import zazu.style
+import zazu.style_cache
+import zazu.styler
 import zazu.util
+import zazu.watch
 
 
 def write_c_file_with_bad_style(file):
@@ -30,28 +45,161 @@ def repo_with_style_errors(repo_with_style):
     return repo_with_style
 
 
+@pytest.fixture()
+def repo_with_autopep8_errors(git_repo):
+    dir = git_repo.working_tree_dir
+    with zazu.util.cd(dir):
+        with open('zazu.yaml', 'a') as file:
+            file.write(yaml.dump({'style': {'autopep8': {}}}))
+        write_py_file_with_bad_style('old.py')
+        git_repo.index.add(['zazu.yaml', 'old.py'])
+        git_repo.index.commit('old style errors')
+        git_repo.git.branch('base')
+        write_py_file_with_bad_style('new.py')
+        git_repo.index.add(['new.py'])
+        git_repo.index.commit('new style errors')
+    return git_repo
+
+
 @pytest.mark.skipif(not distutils.spawn.find_executable('astyle'),
                     reason="requires astyle")
 def test_astyle():
     styler = zazu.plugins.astyle_styler.AstyleStyler(options=['-U'])
-    ret = styler.style_string('void main ( ) {}')
-    assert ret == 'void main() {}'
+    ret = styler.style_string(b'void main ( ) {}')
+    assert ret == b'void main() {}'
     assert styler.default_extensions()
 
 
 def test_autopep8():
     styler = zazu.plugins.autopep8_styler.Autopep8Styler()
-    ret = styler.style_string('def foo ():\n  pass')
-    assert ret == 'def foo():\n    pass\n'
+    ret = styler.style_string(b'def foo ():\n  pass')
+    assert ret == b'def foo():\n    pass\n'
     assert ['*.py'] == styler.default_extensions()
 
 
+def test_autopep8_worker_pool():
+    styler = zazu.plugins.autopep8_styler.Autopep8Styler(options=['--max-line-length=150'])
+    styler.start_workers(1)
+    try:
+        ret = styler.style_string(b'def foo ():\n  pass')
+    finally:
+        styler.stop_workers()
+    assert ret == b'def foo():\n    pass\n'
+    assert styler._pool is None
+
+
+def test_autopep8_worker_pool_cancel():
+    styler = zazu.plugins.autopep8_styler.Autopep8Styler()
+    styler.start_workers(1)
+    results = []
+
+    def style():
+        try:
+            results.append(styler.style_string(b'x=1\n'))
+        except concurrent.futures.CancelledError:
+            results.append(None)
+    threads = [threading.Thread(target=style) for _ in range(8)]
+    for t in threads:
+        t.start()
+    deadline = time.time() + 30
+    while len(styler._futures) + len(results) < len(threads) and time.time() < deadline:
+        time.sleep(0.01)
+    styler.stop_workers(cancel=True)
+    for t in threads:
+        t.join(30)
+    # No caller is left waiting, each call either finished or was cancelled.
+    assert not any(t.is_alive() for t in threads)
+    assert len(results) == 8
+    assert set(results) <= {b'x = 1\n', None}
+
+
+def test_autopep8_worker_pool_bytes():
+    styler = zazu.plugins.autopep8_styler.Autopep8Styler()
+    source = u'# caf\u00e9\nx=1\n'
+    styler.start_workers(1)
+    try:
+        assert styler.style_string(source.encode('utf-8')) == u'# caf\u00e9\nx = 1\n'.encode('utf-8')
+        latin1 = u'# -*- coding: latin-1 -*-\n# caf\u00e9\n'.encode('latin-1')
+        assert styler.style_string(latin1) == latin1
+    finally:
+        styler.stop_workers()
+
+
+def test_autopep8_in_process(tmp_dir, monkeypatch):
+    styler = zazu.plugins.autopep8_styler.Autopep8Styler.from_config({'options': ['--max-line-length=150'], 'inProcess': True},
+                                                                     [], ['*.py'])
+    assert styler.in_process
+    assert not zazu.plugins.autopep8_styler.Autopep8Styler.from_config({}, [], ['*.py']).in_process
+    monkeypatch.setattr(zazu.plugins.autopep8_styler, '_parsed_options', {})
+    with zazu.util.cd(tmp_dir):
+        with open('setup.cfg', 'w') as f:
+            f.write('[pycodestyle]\n')
+        os.utime('setup.cfg', (1000, 1000))
+        # No autopep8 process is launched.
+        monkeypatch.setattr(zazu.util, 'check_popen', None)
+        assert styler.style_string(b'def foo ():\n  pass') == b'def foo():\n    pass\n'
+        assert styler.style_string(b'x=1\n') == b'x = 1\n'
+        assert len(zazu.plugins.autopep8_styler._parsed_options) == 1
+        # The options are parsed again when a config file changes.
+        with open('setup.cfg', 'w') as f:
+            f.write('[pycodestyle]\nignore = E225\n')
+        assert styler.style_string(b'x=1\n') == b'x=1\n'
+        assert len(zazu.plugins.autopep8_styler._parsed_options) == 2
+
+
+def test_autopep8_version(monkeypatch):
+    monkeypatch.setattr(zazu.styler, 'probe_version', lambda args: 'autopep8 0.0.1 ({})'.format(' '.join(args)))
+    styler = zazu.plugins.autopep8_styler.Autopep8Styler()
+    # Without workers the executable on the PATH is run, which may be another install than the imported module.
+    assert styler.version() == 'autopep8 0.0.1 (autopep8 --version)'
+    executable = styler.fingerprint()
+    styler.start_workers(1)
+    try:
+        assert styler.version() == autopep8.__version__
+        assert styler.fingerprint() != executable
+    finally:
+        styler.stop_workers()
+    assert styler.fingerprint() == executable
+    styler.in_process = True
+    assert styler.version() == autopep8.__version__
+
+
+def test_autopep8_style_lines(monkeypatch):
+    monkeypatch.setattr(zazu.plugins.autopep8_styler, '_parsed_options', {})
+    source = b'a=1\nb=2\nc=3\nd=4\ne=5\n'
+    styler = zazu.plugins.autopep8_styler.Autopep8Styler(options=['--max-line-length=150'])
+    assert styler.style_lines(source, []) == source
+    # The lines from the first range to the last are fixed in a single run.
+    assert styler.style_lines(source, [(2, 2), (4, 4)]) == b'a=1\nb = 2\nc = 3\nd = 4\ne=5\n'
+    styler.in_process = True
+    assert styler.style_lines(source, [(2, 2), (4, 4)]) == b'a=1\nb = 2\nc = 3\nd = 4\ne=5\n'
+    assert styler.style_lines(source, [(5, 5)]) == b'a=1\nb=2\nc=3\nd=4\ne = 5\n'
+    # The line ranges don't add entries to the options cache.
+    assert len(zazu.plugins.autopep8_styler._parsed_options) == 1
+    assert styler.style_string(source) == b'a = 1\nb = 2\nc = 3\nd = 4\ne = 5\n'
+
+
+def test_style_cached_worker_pool(repo_with_autopep8_errors):
+    dir = repo_with_autopep8_errors.working_tree_dir
+    with zazu.util.cd(dir):
+        with open('ok.py', 'wb') as f:
+            f.write(u'# caf\u00e9\nx = 1\n'.encode('utf-8'))
+        repo_with_autopep8_errors.git.add('ok.py')
+        runner = click.testing.CliRunner()
+        result = runner.invoke(zazu.cli.cli, ['style', '--cached', '--check', '-v'])
+        assert result.exit_code == 0
+        assert result.output.endswith('0 files with violations in 1 files\n')
+        result = runner.invoke(zazu.cli.cli, ['style', '--cached', '-v'])
+        assert result.exit_code == 0
+        assert result.output.endswith('0 files fixed in 1 files\n')
+
+
 @pytest.mark.skipif(not distutils.spawn.find_executable('clang-format'),
                     reason="requires clang-format")
 def test_clang_format():
     styler = zazu.plugins.clang_format_styler.ClangFormatStyler(options=['-style=google'])
-    ret = styler.style_string('void  main ( ) { }')
-    assert ret == 'void main() {}'
+    ret = styler.style_string(b'void  main ( ) { }')
+    assert ret == b'void main() {}'
     assert styler.default_extensions()
 
 
@@ -117,3 +265,358 @@ def test_styler():
     uut = zazu.styler.Styler()
     with pytest.raises(NotImplementedError):
         uut.style_string('')
+
+
+def test_style_file_cache(mocker, tmp_dir):
+    cache = zazu.style_cache.StyleCache(os.path.join(tmp_dir, 'style_cache.json'))
+    styler = zazu.plugins.autopep8_styler.Autopep8Styler()
+    mocker.patch.object(styler, 'style_string', side_effect=lambda s: s)
+    read_fn = mocker.Mock(return_value='clean\n')
+    assert zazu.style.style_file(styler, 'foo.py', read_fn, None, cache) == ('foo.py', False)
+    assert styler.style_string.call_count == 1
+    assert zazu.style.style_file(styler, 'foo.py', read_fn, None, cache) == ('foo.py', False)
+    assert styler.style_string.call_count == 1
+
+
+def test_style_file_stat_cache(mocker, tmp_dir):
+    path = os.path.join(tmp_dir, 'style_cache.json')
+    styler = zazu.plugins.autopep8_styler.Autopep8Styler()
+    styler._fingerprint = 'abc'
+    mocker.patch.object(styler, 'style_string', side_effect=lambda s: s)
+    with zazu.util.cd(tmp_dir):
+        with open('foo.py', 'wb') as f:
+            f.write(b'clean\n')
+        os.utime('foo.py', (1000, 1000))
+        cache = zazu.style_cache.StyleCache(path)
+        assert zazu.style.style_file(styler, 'foo.py', zazu.style.read_file, None, cache, True) == ('foo.py', False)
+        cache.save()
+        cache = zazu.style_cache.StyleCache(path)
+        read_fn = mocker.Mock()
+        assert zazu.style.style_file(styler, 'foo.py', read_fn, None, cache, True) == ('foo.py', False)
+        assert not read_fn.called
+        mocker.patch('zazu.style_cache.file_hash')
+        assert zazu.style.style_files(styler, ['foo.py'], False, cache) == [('foo.py', False)]
+        assert not zazu.style_cache.file_hash.called
+        assert styler.style_string.call_count == 1
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='uses a shell script as the tool')
+def test_probe_version(tmp_dir, monkeypatch):
+    tool = os.path.join(tmp_dir, 'fake-tool')
+    runs = os.path.join(tmp_dir, 'runs')
+    with open(tool, 'w') as f:
+        f.write('#!/bin/sh\necho run >> {}\necho "fake-tool version 1.0"\n'.format(runs))
+    os.chmod(tool, 0o755)
+    os.utime(tool, (1000, 1000))
+    monkeypatch.setenv('PATH', os.pathsep.join([tmp_dir, os.environ.get('PATH', '')]))
+    cache_path = os.path.join(tmp_dir, 'cache', 'tool_versions.json')
+
+    def run_count():
+        with open(runs) as f:
+            return len(f.readlines())
+    assert zazu.styler.probe_version(['fake-tool', '--version'], cache_path) == 'fake-tool version 1.0'
+    assert zazu.styler.probe_version(['fake-tool', '--version'], cache_path) == 'fake-tool version 1.0'
+    assert run_count() == 1
+    # Installing another version of the tool changes its mtime.
+    with open(tool, 'a') as f:
+        f.write('echo "patched"\n')
+    assert zazu.styler.probe_version(['fake-tool', '--version'], cache_path) == 'fake-tool version 1.0\npatched'
+    assert run_count() == 2
+    assert zazu.styler.probe_version(['fake-tool', '--version'], cache_path) == 'fake-tool version 1.0\npatched'
+    assert run_count() == 2
+    with pytest.raises(click.ClickException):
+        zazu.styler.probe_version(['no-such-tool', '--version'], cache_path)
+
+
+def test_styler_fingerprint_config_files(tmp_dir):
+    with zazu.util.cd(tmp_dir):
+        os.mkdir('sub')
+        styler = zazu.plugins.clang_format_styler.ClangFormatStyler()
+        styler._fingerprint = 'abc'
+        missing = styler.fingerprint('sub/a.cpp')
+        # A config file created after the styler looked up its config files still changes the fingerprint.
+        with open('.clang-format', 'w') as f:
+            f.write('BasedOnStyle: Google\n')
+        assert os.path.join(os.getcwd(), '.clang-format') in styler.config_files('sub/a.cpp')
+        before = styler.fingerprint('sub/a.cpp')
+        assert before != missing
+        with open('.clang-format', 'w') as f:
+            f.write('BasedOnStyle: LLVM\n')
+        os.utime('.clang-format', (0, 0))
+        assert styler.fingerprint('sub/a.cpp') != before
+        styler = zazu.plugins.clang_format_styler.ClangFormatStyler(options=['-style=google'])
+        assert styler.config_files('sub/a.cpp') == []
+        styler = zazu.plugins.astyle_styler.AstyleStyler(options=['--options=astyle.conf'])
+        assert styler.config_files('a.cpp') == [os.path.join(os.getcwd(), 'astyle.conf')]
+        styler = zazu.plugins.autopep8_styler.Autopep8Styler()
+        styler._fingerprint = 'abc'
+        assert os.path.join(os.getcwd(), 'setup.cfg') in styler.config_files('a.py')
+        before = styler.fingerprint('a.py')
+        with open('setup.cfg', 'w') as f:
+            f.write('[pycodestyle]\nmax-line-length = 150\n')
+        assert styler.fingerprint('a.py') != before
+
+
+def test_styler_style_files(mocker, tmp_dir):
+    with zazu.util.cd(tmp_dir):
+        write_py_file_with_bad_style('bad.py')
+        with open('good.py', 'w') as f:
+            f.write('good\n')
+        styler = zazu.plugins.autopep8_styler.Autopep8Styler()
+        mocker.patch.object(styler, 'style_string', return_value=b'good\n')
+        assert styler.style_files(['bad.py', 'good.py']) == [('bad.py', True), ('good.py', False)]
+        assert styler.style_files(['bad.py', 'good.py'], fix=True) == [('bad.py', True), ('good.py', False)]
+        assert styler.style_files(['bad.py', 'good.py']) == [('bad.py', False), ('good.py', False)]
+
+
+def test_clang_format_style_lines(mocker):
+    mocker.patch('zazu.util.check_popen', return_value=b'styled')
+    styler = zazu.plugins.clang_format_styler.ClangFormatStyler(options=['-style=google'])
+    assert styler.style_lines(b'input', []) == b'input'
+    assert not zazu.util.check_popen.called
+    assert styler.style_lines(b'input', [(1, 2), (5, 5)]) == b'styled'
+    zazu.util.check_popen.assert_called_once_with(args=['clang-format', '-lines=1:2', '-lines=5:5', '-style=google'],
+                                                  stdin_str=b'input')
+
+
+def test_clang_format_style_files(mocker):
+    xml = ("<?xml version='1.0'?>\n<replacements xml:space='preserve' incomplete_format='false'>\n"
+           "<replacement offset='4' length='2'>&#10;</replacement>\n</replacements>\n"
+           "<?xml version='1.0'?>\n<replacements xml:space='preserve' incomplete_format='false'>\n</replacements>\n")
+    mocker.patch('zazu.util.check_popen', return_value=xml.encode('utf-8'))
+    styler = zazu.plugins.clang_format_styler.ClangFormatStyler(options=['-style=google'])
+    assert styler.style_files(['a.cpp', 'b.cpp']) == [('a.cpp', True), ('b.cpp', False)]
+    zazu.util.check_popen.assert_called_once_with(args=['clang-format', '-output-replacements-xml', '-style=google',
+                                                        'a.cpp', 'b.cpp'])
+    assert styler.style_files([]) == []
+
+
+def test_astyle_style_files(mocker):
+    output = 'Formatted  {}\n'.format(os.path.join(os.getcwd(), 'src', 'a.cpp'))
+    mocker.patch('zazu.util.check_popen', return_value=output.encode('utf-8'))
+    styler = zazu.plugins.astyle_styler.AstyleStyler(options=['-q', '--style=google'])
+    paths = [os.path.join('src', 'a.cpp'), 'a.cpp']
+    assert styler.style_files(paths) == [(paths[0], True), ('a.cpp', False)]
+    args = zazu.util.check_popen.call_args[1]['args']
+    assert args == ['astyle', '--dry-run', '--formatted', '--style=google'] + paths
+
+
+def test_style_files_cache(mocker, tmp_dir):
+    cache = zazu.style_cache.StyleCache(os.path.join(tmp_dir, 'style_cache.json'))
+    with zazu.util.cd(tmp_dir):
+        with open('good.py', 'w') as f:
+            f.write('good\n')
+        styler = zazu.plugins.autopep8_styler.Autopep8Styler()
+        mocker.patch.object(styler, 'style_files', side_effect=lambda paths, fix: [(p, False) for p in paths])
+        assert zazu.style.style_files(styler, ['good.py'], False, cache) == [('good.py', False)]
+        assert zazu.style.style_files(styler, ['good.py'], False, cache) == [('good.py', False)]
+        styler.style_files.assert_called_once_with(['good.py'], False)
+
+
+def test_chunks():
+    assert zazu.style.chunks([1, 2, 3, 4, 5], 2) == [[1, 2], [3, 4], [5]]
+    assert zazu.style.chunks([], 2) == []
+
+
+def test_style_since(repo_with_autopep8_errors):
+    dir = repo_with_autopep8_errors.working_tree_dir
+    with zazu.util.cd(dir):
+        runner = click.testing.CliRunner()
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '-v'])
+        assert result.output.endswith('2 files with violations in 2 files\n')
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '-v', '--since', 'base'])
+        assert result.exit_code
+        assert result.output.endswith('1 files with violations in 1 files\n')
+        assert 'new.py' in result.output
+        with open('zazu.yaml', 'w') as file:
+            file.write(yaml.dump({'style': {'autopep8': {}, 'since': 'HEAD'}}))
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '-v'])
+        assert result.exit_code == 0
+        assert result.output.endswith('0 files with violations in 0 files\n')
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '-v', '--all'])
+        assert result.output.endswith('2 files with violations in 2 files\n')
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '--since', 'origin/missing'])
+        assert result.exit_code
+        assert 'unable to find the changes since "origin/missing"' in result.output
+
+
+def test_unified_diff():
+    lines = list(zazu.style.unified_diff('a.py', 'x=1\ny=2', 'x = 1\ny = 2\n'))
+    assert lines == ['--- a/a.py\n', '+++ b/a.py\n', '@@ -1,2 +1,2 @@\n', '-x=1\n', '-y=2\n\\ No newline at end of file\n',
+                     '+x = 1\n', '+y = 2\n']
+    lines = list(zazu.style.unified_diff('a.py', b'x=1\n', b'x = 1\n'))
+    assert lines == [b'--- a/a.py\n', b'+++ b/a.py\n', b'@@ -1 +1 @@\n', b'-x=1\n', b'+x = 1\n']
+
+
+def test_diff_printer(mocker):
+    mocker.patch('click.echo')
+    write_fn = mocker.Mock()
+    uut = zazu.style.DiffPrinter(write_fn, buffer_size=10)
+    uut('a.py', 'x=1\n', 'x = 1\n')
+    output = ''.join(c[0][0] for c in click.echo.call_args_list)
+    assert output == '--- a/a.py\n+++ b/a.py\n@@ -1 +1 @@\n-x=1\n+x = 1\n'
+    assert click.echo.call_count > 1
+    write_fn.assert_called_once_with('a.py', 'x=1\n', 'x = 1\n')
+
+
+def test_style_diff(repo_with_autopep8_errors):
+    dir = repo_with_autopep8_errors.working_tree_dir
+    with zazu.util.cd(dir):
+        runner = click.testing.CliRunner()
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '--diff'])
+        assert result.exit_code
+        assert '--- a/new.py\n+++ b/new.py\n' in result.output
+        assert '--- a/old.py\n+++ b/old.py\n' in result.output
+
+
+def test_stage_patcher(mocker, tmp_dir):
+    mocker.patch('zazu.util.check_popen')
+    with zazu.util.cd(tmp_dir):
+        with open('full.py', 'w') as f:
+            f.write('staged\n')
+        with open('partial.py', 'w') as f:
+            f.write('staged\nunstaged\n')
+        uut = zazu.style.StagePatcher()
+        uut('full.py', b'staged\n', b'styled\n')
+        uut('partial.py', b'staged\n', b'styled\n')
+        assert not zazu.util.check_popen.called
+        with open('full.py') as f:
+            assert f.read() == 'styled\n'
+        uut.apply()
+        assert zazu.util.check_popen.call_count == 2
+        zazu.util.check_popen.assert_any_call(args=['git', 'update-index', '--add', '-z', '--stdin'], stdin_str=b'full.py')
+        patch = zazu.util.check_popen.call_args[1]['stdin_str']
+        assert patch.startswith(b'--- a/partial.py\n+++ b/partial.py\n')
+        uut.apply()
+        assert zazu.util.check_popen.call_count == 2
+        with pytest.raises(click.ClickException):
+            uut('partial.py', b'no newline', b'styled\n')
+
+
+def test_style_non_utf8(repo_with_autopep8_errors):
+    dir = repo_with_autopep8_errors.working_tree_dir
+    with zazu.util.cd(dir):
+        latin1 = u'# -*- coding: latin-1 -*-\n# caf\u00e9\nx=1\n'.encode('latin-1')
+        with open('latin1.py', 'wb') as f:
+            f.write(latin1)
+        repo_with_autopep8_errors.git.add('latin1.py')
+        runner = click.testing.CliRunner()
+        for args in [['--worker-pool'], ['--no-worker-pool']]:
+            result = runner.invoke(zazu.cli.cli, ['style', '--check', '--no-cache', 'latin1.py'] + args)
+            assert result.exit_code
+            assert result.exception is None or isinstance(result.exception, SystemExit)
+        result = runner.invoke(zazu.cli.cli, ['style', '--no-worker-pool', 'latin1.py'])
+        assert result.exit_code == 0
+        with open('latin1.py', 'rb') as f:
+            assert f.read() == latin1.replace(b'x=1', b'x = 1')
+
+
+def test_style_cached_closes_reader(mocker, repo_with_autopep8_errors):
+    dir = repo_with_autopep8_errors.working_tree_dir
+    with zazu.util.cd(dir):
+        write_py_file_with_bad_style('staged.py')
+        repo_with_autopep8_errors.git.add('staged.py')
+        mocker.patch('zazu.git_helper.StagedFileReader.close')
+        mocker.patch('zazu.style.style_file', side_effect=click.ClickException('boom'))
+        runner = click.testing.CliRunner()
+        result = runner.invoke(zazu.cli.cli, ['style', '--cached'])
+        assert result.exit_code
+        zazu.git_helper.StagedFileReader.close.assert_called_once_with()
+
+
+def test_style_profile(repo_with_autopep8_errors, monkeypatch):
+    # Plugins found by earlier tests would otherwise skip discovery.
+    monkeypatch.setattr(zazu.config, '_plugins', {})
+    dir = repo_with_autopep8_errors.working_tree_dir
+    with zazu.util.cd(dir):
+        runner = click.testing.CliRunner()
+        result = runner.invoke(zazu.cli.cli, ['--profile-trace', 'trace.json', 'style', '--check', '--no-worker-pool'])
+        assert result.exit_code
+        assert not zazu.profiler.enabled()
+        with open('trace.json') as f:
+            names = set(e['name'] for e in json.load(f)['traceEvents'])
+        assert {'config load', 'plugin discovery', 'scantree', 'style autopep8', 'subprocess autopep8'} <= names
+
+
+def test_style_jobs(repo_with_autopep8_errors):
+    dir = repo_with_autopep8_errors.working_tree_dir
+    with zazu.util.cd(dir):
+        runner = click.testing.CliRunner()
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '-v', '--jobs', '1'])
+        assert result.output.endswith('2 files with violations in 2 files\n')
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '--jobs', '0'])
+        assert result.exit_code == 2
+        with open('zazu.yaml', 'w') as file:
+            file.write(yaml.dump({'style': {'autopep8': {}, 'jobs': -1}}))
+        result = runner.invoke(zazu.cli.cli, ['style', '--check'])
+        assert result.exit_code
+        assert 'must be a positive integer' in result.output
+
+
+def test_style_watch(repo_with_autopep8_errors, monkeypatch):
+    dir = repo_with_autopep8_errors.working_tree_dir
+
+    def changes(self):
+        # Fix one file and break another, as if they were saved in an editor.
+        with open('old.py', 'w') as f:
+            f.write('def main():\n    pass\n')
+        write_py_file_with_bad_style('newer.py')
+        yield self.poll()
+        # A file with a violation that is deleted no longer counts.
+        os.remove('newer.py')
+        yield self.poll()
+        raise KeyboardInterrupt()
+    monkeypatch.setattr(zazu.watch.TreeWatcher, 'changes', changes)
+    with zazu.util.cd(dir):
+        runner = click.testing.CliRunner()
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '--cached', '--watch'])
+        assert result.exit_code == 2
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '--watch'])
+        assert result.exit_code
+        assert '[ OK ] (autopep8) old.py' in result.output
+        assert '[FAIL] (autopep8) newer.py' in result.output
+        assert '2 files with violations\n' in result.output
+        assert result.output.endswith('1 files with violations\n')
+        # The clean file's verdict was cached when it was saved.
+        stat = os.stat('old.py')
+        styler = zazu.config.Config(dir).stylers()[0]
+        # The files were styled by the worker pool, which runs the imported autopep8 like in-process styling does.
+        styler.in_process = True
+        cache = zazu.style_cache.StyleCache(zazu.style_cache.default_path(repo_with_autopep8_errors))
+        assert cache.is_clean_stat(styler, 'old.py', stat)
+
+
+def test_style_changed_lines(repo_with_autopep8_errors):
+    dir = repo_with_autopep8_errors.working_tree_dir
+    with zazu.util.cd(dir):
+        with open('old.py', 'wb') as f:
+            f.write(b'x=1\ny = 2\nz = 3\n')
+        repo_with_autopep8_errors.git.add('old.py')
+        repo_with_autopep8_errors.index.commit('old violation')
+        with open('old.py', 'wb') as f:
+            f.write(b'x=1\ny = 2\nz=4\n')
+        repo_with_autopep8_errors.git.add('old.py')
+        runner = click.testing.CliRunner()
+        result = runner.invoke(zazu.cli.cli, ['style', '--cached', '--check', '--changed-lines'])
+        assert result.exit_code
+        result = runner.invoke(zazu.cli.cli, ['style', '--cached', '--changed-lines'])
+        assert result.exit_code == 0
+        # Only the changed line was fixed.
+        assert zazu.style.read_file('old.py') == b'x=1\ny = 2\nz = 4\n'
+        result = runner.invoke(zazu.cli.cli, ['style', '--cached', '--check', '--changed-lines'])
+        assert result.exit_code == 0
+        result = runner.invoke(zazu.cli.cli, ['style', '--cached', '--check'])
+        assert result.exit_code
+        with open('zazu.yaml', 'a') as file:
+            file.write(yaml.dump({'style': {'autopep8': {}, 'changedLines': True}}))
+        result = runner.invoke(zazu.cli.cli, ['style', '--cached', '--check'])
+        assert result.exit_code == 0
+
+
+def test_style_fail_fast(repo_with_autopep8_errors):
+    dir = repo_with_autopep8_errors.working_tree_dir
+    with zazu.util.cd(dir):
+        runner = click.testing.CliRunner()
+        result = runner.invoke(zazu.cli.cli, ['style', '--check', '-v', '--fail-fast', '--no-cache'])
+        assert result.exit_code
+        assert result.output.endswith('1 files with violations in 1 files\n')
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+import os
+import tempfile
+import zazu.style_cache
+
+__author__ = "Nicholas Wiles"
+__copyright__ = "Copyright 2017"
+
+
+class FakeStyler(object):
+
+    def __init__(self, fingerprint='abc'):
+        self._fingerprint = fingerprint
+
+    def fingerprint(self, path=None):
+        return self._fingerprint + (path or '')
+
+    @staticmethod
+    def type():
+        return 'fake'
+
+
+def test_blob_hash():
+    # Matches "git hash-object" for the same content.
+    assert zazu.style_cache.blob_hash('') == 'e69de29bb2d1d6434b8b29ae775ad8c2e48c5391'
+    assert zazu.style_cache.blob_hash('hello\n') == 'ce013625030ba8dba906f756967f9e9ca394464a'
+    assert zazu.style_cache.blob_hash(b'hello\n') == 'ce013625030ba8dba906f756967f9e9ca394464a'
+
+
+def test_file_hash():
+    path = os.path.join(tempfile.mkdtemp(), 'file')
+    with open(path, 'wb') as f:
+        f.write(b'hello\n')
+    assert zazu.style_cache.file_hash(path) == 'ce013625030ba8dba906f756967f9e9ca394464a'
+    assert zazu.style_cache.file_hash(path, mmap_size=1) == 'ce013625030ba8dba906f756967f9e9ca394464a'
+    with open(path, 'wb') as f:
+        pass
+    assert zazu.style_cache.file_hash(path, mmap_size=0) == 'e69de29bb2d1d6434b8b29ae775ad8c2e48c5391'
+
+
+def test_style_cache():
+    path = os.path.join(tempfile.mkdtemp(), 'zazu', 'style_cache.json')
+    styler = FakeStyler()
+    uut = zazu.style_cache.StyleCache(path)
+    assert not uut.is_clean(styler, 'foo')
+    uut.mark_clean(styler, 'foo')
+    assert uut.is_clean(styler, 'foo')
+    assert not uut.is_clean(styler, 'bar')
+    uut.save()
+    assert os.path.exists(path)
+    uut = zazu.style_cache.StyleCache(path)
+    assert uut.is_clean(styler, 'foo')
+    assert not uut.is_clean(FakeStyler('def'), 'foo')
+
+
+def test_style_cache_fingerprint_change():
+    path = os.path.join(tempfile.mkdtemp(), 'style_cache.json')
+    uut = zazu.style_cache.StyleCache(path)
+    uut.mark_clean(FakeStyler('abc'), 'foo')
+    assert not uut.is_clean(FakeStyler('def'), 'foo')
+    assert uut.is_clean(FakeStyler('abc'), 'foo')
+    uut.mark_clean(FakeStyler('abc'), 'foo', 'a.py')
+    assert not uut.is_clean(FakeStyler('abc'), 'foo', 'b.py')
+    assert uut.is_clean(FakeStyler('abc'), 'foo', 'a.py')
+
+
+def test_style_cache_prune():
+    path = os.path.join(tempfile.mkdtemp(), 'style_cache.json')
+    uut = zazu.style_cache.StyleCache(path)
+    uut.mark_clean(FakeStyler(), 'foo')
+    uut.mark_clean(FakeStyler(), 'bar')
+    uut.save()
+    uut = zazu.style_cache.StyleCache(path)
+    assert uut.is_clean(FakeStyler(), 'foo')
+    uut.save(prune=True)
+    uut = zazu.style_cache.StyleCache(path)
+    assert uut.is_clean(FakeStyler(), 'foo')
+    assert not uut.is_clean(FakeStyler(), 'bar')
+
+
+def test_style_cache_max_entries():
+    path = os.path.join(tempfile.mkdtemp(), 'style_cache.json')
+    uut = zazu.style_cache.StyleCache(path, max_entries=2)
+    for string in ['a', 'b', 'c']:
+        uut.mark_clean(FakeStyler(), string)
+    assert uut.is_clean(FakeStyler(), 'a')
+    uut.save()
+    uut = zazu.style_cache.StyleCache(path, max_entries=2)
+    assert uut.is_clean(FakeStyler(), 'a')
+    assert not uut.is_clean(FakeStyler(), 'b')
+    assert uut.is_clean(FakeStyler(), 'c')
+
+
+def test_style_cache_corrupt():
+    path = os.path.join(tempfile.mkdtemp(), 'style_cache.json')
+    with open(path, 'w') as f:
+        f.write('{')
+    uut = zazu.style_cache.StyleCache(path)
+    assert not uut.is_clean(FakeStyler(), 'foo')
+
+
+def test_style_cache_stat():
+    dir = tempfile.mkdtemp()
+    path = os.path.join(dir, 'style_cache.json')
+    file = os.path.join(dir, 'foo.py')
+    with open(file, 'w') as f:
+        f.write('foo')
+    os.utime(file, (1000, 1000))
+    stat = os.stat(file)
+    uut = zazu.style_cache.StyleCache(path)
+    uut.mark_clean(FakeStyler(), 'foo', file, stat=stat)
+    # Nothing is trusted until the cache has been written after the file's mtime.
+    assert not uut.is_clean_stat(FakeStyler(), file, stat)
+    uut.save()
+    uut = zazu.style_cache.StyleCache(path)
+    assert uut.is_clean_stat(FakeStyler(), file, stat)
+    assert not uut.is_clean_stat(FakeStyler('def'), file, stat)
+    with open(file, 'w') as f:
+        f.write('bar')
+    assert not uut.is_clean_stat(FakeStyler(), file, os.stat(file))
+
+
+def test_style_cache_racy_stat():
+    dir = tempfile.mkdtemp()
+    path = os.path.join(dir, 'style_cache.json')
+    file = os.path.join(dir, 'foo.py')
+    with open(file, 'w') as f:
+        f.write('foo')
+    uut = zazu.style_cache.StyleCache(path)
+    uut.mark_clean(FakeStyler(), 'foo', file, stat=os.stat(file))
+    uut.save()
+    os.utime(path, (0, 0))
+    uut = zazu.style_cache.StyleCache(path)
+    assert not uut.is_clean_stat(FakeStyler(), file, os.stat(file))
+    uut.mark_clean(FakeStyler(), 'foo', file, stat=os.stat(file))
+    uut.save()
+    os.utime(file, (1000, 1000))
+    uut = zazu.style_cache.StyleCache(path)
+    uut.mark_clean(FakeStyler(), 'foo', file, stat=os.stat(file))
+    uut.save()
+    uut = zazu.style_cache.StyleCache(path)
+    assert uut.is_clean_stat(FakeStyler(), file, os.stat(file))
@@ -1,9 +1,12 @@
 # -*- coding: utf-8 -*-
 import click
+import functools
 import os
 import pytest
 import subprocess
 import tempfile
+import threading
+import time
 import zazu.util
 try:
     import __builtin__ as builtins  # NOQA
@@ -81,6 +84,15 @@ def call(*args, **kwargs):
         raise_uninstalled(args[0][0])
 
 
+def test_atomic_write(tmp_dir):
+    path = os.path.join(tmp_dir, 'sub', 'file')
+    zazu.util.atomic_write(path, lambda f: f.write('old'))
+    zazu.util.atomic_write(path, lambda f: f.write(b'new'), 'wb')
+    with open(path) as f:
+        assert f.read() == 'new'
+    assert os.listdir(os.path.dirname(path)) == ['file']
+
+
 def test_pprint_list():
     list = ['a', 'b', 'c']
     formatted = zazu.util.pprint_list(list)
@@ -133,3 +145,117 @@ def test_pick_interupted(monkeypatch):
     monkeypatch.setattr('inquirer.prompt', lambda x: None)
     with pytest.raises(KeyboardInterrupt):
         zazu.util.pick(choices, 'foo')
+
+
+def test_filter_files():
+    paths = ['file.yes', 'file.no', 'exclude/excluded_file.yes', 'sub/exclude/file.yes', '.hidden/file.yes',
+             'sub/.file.yes', 'sub/file.yes']
+    results = zazu.util.filter_files(paths, ['*.yes'], ['exclude'], exclude_hidden=True)
+    assert results == ['file.yes', os.path.join('sub', 'exclude', 'file.yes'), os.path.join('sub', 'file.yes')]
+    results = zazu.util.filter_files(paths, ['*.yes'], ['exclude', 'sub/exclude/'], exclude_hidden=False)
+    assert results == ['file.yes', os.path.join('.hidden', 'file.yes'), os.path.join('sub', '.file.yes'), os.path.join('sub', 'file.yes')]
+
+
+def test_path_matcher():
+    uut = zazu.util.PathMatcher(['*.py', 'src/*.c[cp]p', 'include/*.h'], ['build', '*_pb2.py'], exclude_hidden=True)
+    assert uut.match_file('foo.py')
+    assert uut.match_file(os.path.join('sub', 'foo.py'))
+    assert not uut.match_file('foo_pb2.py')
+    assert uut.match_file(os.path.join('src', 'sub', 'foo.cpp'))
+    assert not uut.match_file(os.path.join('test', 'foo.cpp'))
+    assert uut.prune_dir('build')
+    assert uut.prune_dir('.git')
+    assert not uut.prune_dir('src')
+    assert not uut.prune_dir('test')
+
+
+def test_path_matcher_prefix_pruning():
+    uut = zazu.util.PathMatcher(['src/*.cpp', 'include/*.h'], [])
+    assert not uut.prune_dir('src')
+    assert not uut.prune_dir(os.path.join('src', 'sub'))
+    assert not uut.prune_dir('include')
+    assert uut.prune_dir('test')
+    assert uut.prune_dir('srcs')
+    assert not zazu.util.PathMatcher(['src*/*.cpp'], []).prune_dir('srcs')
+    assert zazu.util.PathMatcher([], []).prune_dir('src')
+
+
+def test_classify_tree():
+    dir = tempfile.mkdtemp()
+    os.mkdir(os.path.join(dir, 'py_only'))
+    touch_file(os.path.join(dir, 'a.py'))
+    touch_file(os.path.join(dir, 'a.cpp'))
+    touch_file(os.path.join(dir, 'py_only', 'b.py'))
+    touch_file(os.path.join(dir, 'py_only', 'b.cpp'))
+    patterns = [(['*.py'], []), (['*.cpp'], ['py_only'])]
+    results = zazu.util.classify_tree(dir, patterns, exclude_hidden=True)
+    assert sorted(results[0]) == ['a.py', os.path.join('py_only', 'b.py')]
+    assert results[1] == ['a.cpp']
+    paths = ['a.py', 'a.cpp', 'py_only/b.py', 'py_only/b.cpp']
+    results = zazu.util.classify_files(paths, patterns, exclude_hidden=True)
+    assert results == [['a.py', os.path.join('py_only', 'b.py')], ['a.cpp']]
+
+
+def test_dispatch():
+    results = zazu.util.dispatch([lambda: 1, lambda: 2, lambda: 3], max_workers=2)
+    assert sorted(results) == [1, 2, 3]
+    results = zazu.util.dispatch((functools.partial(pow, 2, i) for i in range(10)), max_workers=2, use_processes=True)
+    assert sorted(results) == [2 ** i for i in range(10)]
+
+
+def test_dispatch_bounded():
+    consumed = []
+
+    def work():
+        for i in range(100):
+            consumed.append(i)
+            yield functools.partial(int, i)
+    results = zazu.util.dispatch(work(), max_workers=2, max_in_flight=4)
+    assert next(results) in range(4)
+    assert len(consumed) <= 5
+    results.close()
+    assert len(consumed) <= 5
+
+
+def test_dispatch_exception():
+    def fail():
+        raise ValueError()
+    with pytest.raises(ValueError):
+        list(zazu.util.dispatch([fail]))
+
+
+def test_cpu_count(mocker):
+    mocker.patch('zazu.util.cgroup_cpu_quota', return_value=None)
+    count = zazu.util.cpu_count()
+    assert count >= 1
+    mocker.patch('zazu.util.cgroup_cpu_quota', return_value=0.5)
+    assert zazu.util.cpu_count() == 1
+
+
+def test_cgroup_cpu_quota(mocker):
+    mocker.patch('zazu.util.open', mocker.mock_open(read_data='150000 100000\n'), create=True)
+    assert zazu.util.cgroup_cpu_quota() == 1.5
+    mocker.patch('zazu.util.open', mocker.mock_open(read_data='max 100000\n'), create=True)
+    assert zazu.util.cgroup_cpu_quota() is None
+
+
+def test_kill_running_processes():
+    errors = []
+
+    def run():
+        try:
+            zazu.util.check_popen(['sleep', '10'])
+        except subprocess.CalledProcessError as e:
+            errors.append(e)
+    thread = threading.Thread(target=run)
+    thread.start()
+    while not zazu.util._running_processes:
+        time.sleep(0.01)
+    zazu.util.kill_running_processes()
+    thread.join()
+    assert len(errors) == 1
+    # New processes are killed as well until resumed.
+    with pytest.raises(subprocess.CalledProcessError):
+        zazu.util.check_popen(['sleep', '10'])
+    zazu.util.resume_processes()
+    assert zazu.util.check_popen(['true']) == b''
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+import os
+import zazu.util
+import zazu.watch
+
+__author__ = "Nicholas Wiles"
+__copyright__ = "Copyright 2017"
+
+
+def touch(path, mtime=None):
+    with open(path, 'a'):
+        pass
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+
+def test_tree_watcher(tmp_dir):
+    os.mkdir(os.path.join(tmp_dir, 'build'))
+    touch(os.path.join(tmp_dir, 'a.py'), 1000)
+    touch(os.path.join(tmp_dir, 'b.cpp'), 1000)
+    uut = zazu.watch.TreeWatcher(tmp_dir, [(['*.py'], ['build']), (['*.cpp'], [])], interval=0, use_watchdog=False)
+    try:
+        assert uut.poll() == [([], []), ([], [])]
+        touch(os.path.join(tmp_dir, 'a.py'), 2000)
+        touch(os.path.join(tmp_dir, 'c.py'))
+        touch(os.path.join(tmp_dir, 'build', 'd.py'))
+        touch(os.path.join(tmp_dir, 'e.txt'))
+        assert uut.poll() == [(['a.py', 'c.py'], []), ([], [])]
+        assert uut.poll() == [([], []), ([], [])]
+        os.remove(os.path.join(tmp_dir, 'c.py'))
+        touch(os.path.join(tmp_dir, 'b.cpp'), 2000)
+        assert next(uut.changes()) == [([], ['c.py']), (['b.cpp'], [])]
+        # A file that is deleted and created again is new.
+        touch(os.path.join(tmp_dir, 'c.py'))
+        assert uut.poll() == [(['c.py'], []), ([], [])]
+        os.rename(os.path.join(tmp_dir, 'c.py'), os.path.join(tmp_dir, 'f.py'))
+        assert next(uut.changes()) == [(['f.py'], ['c.py']), ([], [])]
+    finally:
+        uut.close()
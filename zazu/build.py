@@ -2,6 +2,7 @@
 """Build command for zazu."""
 import zazu.cmake_helper
 import zazu.config
+import zazu.profiler
 import zazu.util
 zazu.util.lazy_import(locals(), [
     'click',
@@ -278,7 +279,8 @@ def script_build(repo_root, spec, build_args, verbose):
     for s in spec.build_script():
         if verbose:
             click.echo(str(s))
-        ret = subprocess.call(str(s), shell=True, cwd=repo_root, env=env)
+        with zazu.profiler.subprocess_span(str(s)):
+            ret = subprocess.call(str(s), shell=True, cwd=repo_root, env=env)
         if ret:
             raise click.ClickException("{} exited with code {}".format(str(s), ret))
 
@@ -302,7 +304,7 @@ def add_version_args(repo_root, build_num, args):
     args['ZAZU_BUILD_VERSION_PEP440'] = pep440_from_semver(semver)
 
 
-@click.command()
+@click.command(short_help='Build project targets.')
 @click.pass_context
 @click.option('-a', '--arch', help='the desired architecture to build for')
 @click.option('-t', '--type', type=click.Choice(zazu.cmake_helper.build_types),
@@ -1,25 +1,93 @@
 # -*- coding: utf-8 -*-
 """Entry point for zazu."""
 import click
+import functools
+import importlib
 import os
-import zazu.build
 import zazu.config
-import zazu.dev.commands
 import zazu.git_helper
-import zazu.repo.commands
-import zazu.style
-import zazu.upgrade
+import zazu.profiler
 
 __author__ = "Nicholas Wiles"
 __copyright__ = "Copyright 2016"
 
 
-@click.group()
+class LazyGroup(click.Group):
+    """A click Group that only imports the module of a subcommand when that subcommand is run.
+
+    Listing the subcommands in the help uses the short help stored with them, so it doesn't import anything either.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """Constructor.
+
+        Args:
+            lazy_commands (dict): maps each subcommand name to a (module, attribute, short help) tuple, the short help must
+                match the short_help the subcommand declares.
+            args, kwargs: passed to click.Group.
+        """
+        self.lazy_commands = kwargs.pop('lazy_commands', {})
+        super(LazyGroup, self).__init__(*args, **kwargs)
+
+    def list_commands(self, ctx):
+        """Return the names of all subcommands, whether or not they have been imported."""
+        return sorted(set(super(LazyGroup, self).list_commands(ctx)) | set(self.lazy_commands))
+
+    def get_command(self, ctx, name):
+        """Return a subcommand, importing it if needed."""
+        if name in self.lazy_commands and name not in self.commands:
+            module, attribute, _ = self.lazy_commands[name]
+            self.add_command(getattr(importlib.import_module(module), attribute), name)
+        return super(LazyGroup, self).get_command(ctx, name)
+
+    def format_commands(self, ctx, formatter):
+        """Write the subcommands and their short help to the help formatter."""
+        rows = []
+        for name in self.list_commands(ctx):
+            if name in self.commands:
+                command = self.commands[name]
+                if getattr(command, 'hidden', False):
+                    continue
+                rows.append((name, command.get_short_help_str()))
+            else:
+                rows.append((name, self.lazy_commands[name][2]))
+        if rows:
+            with formatter.section('Commands'):
+                formatter.write_dl(rows)
+
+
+def report_profile(trace_path):
+    """Print the profiling summary and write the trace file if one was requested, then stop profiling."""
+    click.echo(zazu.profiler.format_summary(), err=True)
+    if trace_path:
+        zazu.profiler.write_chrome_trace(trace_path)
+        click.echo('wrote profile trace to {}'.format(trace_path), err=True)
+    zazu.profiler.disable()
+
+
+@click.group(cls=LazyGroup, lazy_commands={
+    'build': ('zazu.build', 'build', 'Build project targets.'),
+    'daemon': ('zazu.daemon', 'daemon', 'Serve the git hooks from a background process.'),
+    'dev': ('zazu.dev.commands', 'dev', 'Create or update work items.'),
+    'repo': ('zazu.repo.commands', 'repo', 'Manage repository.'),
+    'style': ('zazu.style', 'style', 'Style repo files or check that they are valid style.'),
+    'upgrade': ('zazu.upgrade', 'upgrade', 'Upgrade Zazu using pip.')
+})
 @click.version_option(version=zazu.__version__)
+@click.option('--profile', is_flag=True, envvar='ZAZU_PROFILE',
+              help='print the time spent in each phase of the command, the ZAZU_PROFILE environment variable also enables this')
+@click.option('--profile-trace', metavar='FILE', envvar='ZAZU_PROFILE_TRACE',
+              help='profile the command and write a Chrome trace event JSON file of its phases')
 @click.pass_context
-def cli(ctx):
+def cli(ctx, profile, profile_trace):
     """Entry point for zazu cli."""
-    ctx.obj = zazu.config.Config(zazu.git_helper.get_repo_root(os.getcwd()))
+    if profile or profile_trace:
+        zazu.profiler.enable()
+        ctx.call_on_close(functools.partial(report_profile, profile_trace))
+    # The daemon passes in the Config it keeps between commands.
+    if ctx.obj is None:
+        with zazu.profiler.span('repo discovery'):
+            ctx.obj = zazu.config.Config(zazu.git_helper.get_repo_root(os.getcwd()))
 
 
 def init():
@@ -28,9 +96,4 @@ def init():
         cli()
 
 
-cli.add_command(zazu.upgrade.upgrade)
-cli.add_command(zazu.style.style)
-cli.add_command(zazu.build.build)
-cli.add_command(zazu.dev.commands.dev)
-cli.add_command(zazu.repo.commands.repo)
 init()
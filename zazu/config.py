@@ -3,11 +3,14 @@
 import zazu.build_server
 import zazu.code_reviewer
 import zazu.issue_tracker
+import zazu.profiler
+import zazu.style_cache
 import zazu.util
 zazu.util.lazy_import(locals(), [
     'click',
     'git',
     'os',
+    'pickle',
     'straight.plugin',
     'yaml'
 ])
@@ -16,6 +19,29 @@ __author__ = "Nicholas Wiles"
 __copyright__ = "Copyright 2016"
 
 PROJECT_FILE_NAMES = ['zazu.yaml', '.zazu.yaml']
+# Keys of the style config that are settings rather than stylers.
+STYLE_SETTINGS = ['changedLines', 'exclude', 'include', 'jobs', 'since', 'workerPool']
+# The plugin classes found in zazu.plugins so far, keyed by the type they subclass.
+_plugins = {}
+
+
+def load_plugins(subclass):
+    """Return the plugin classes in zazu.plugins that subclass a type.
+
+    The plugin modules are only imported and scanned the first time each type is asked for, later calls are a dict lookup.
+
+    Args:
+        subclass (type): the base class of the plugins.
+
+    Returns:
+        list of the plugin classes.
+    """
+    try:
+        return _plugins[subclass]
+    except KeyError:
+        with zazu.profiler.span('plugin discovery'):
+            plugins = list(straight.plugin.load('zazu.plugins', subclasses=subclass))
+        return _plugins.setdefault(subclass, plugins)
 
 
 class PluginFactory(object):
@@ -33,8 +59,7 @@ class PluginFactory(object):
 
     def from_config(self, config):
         """Make and initialize a plugin object from a config."""
-        plugins = straight.plugin.load('zazu.plugins', subclasses=self._subclass)
-        known_types = {p.type().lower(): p.from_config for p in plugins}
+        known_types = {p.type().lower(): p.from_config for p in load_plugins(self._subclass)}
         if 'type' in config:
             type = config['type']
             type = type.lower()
@@ -56,11 +81,10 @@ build_server_factory = PluginFactory('buildServer', zazu.build_server.BuildServe
 def styler_factory(config):
     """Make and initialize the Stylers from the config."""
     stylers = []
-    plugins = straight.plugin.load('zazu.plugins', subclasses=zazu.styler.Styler)
-    known_types = {p.type(): p for p in plugins}
+    known_types = {p.type(): p for p in load_plugins(zazu.styler.Styler)}
     excludes = config.get('exclude', [])
     for k in config.keys():
-        if k not in ['exclude', 'include']:
+        if k not in STYLE_SETTINGS:
             if k in known_types:
                 includes = config.get('include', known_types[k].default_extensions())
                 stylers.append(known_types[k].from_config(config[k], excludes, includes))
@@ -90,22 +114,83 @@ def make_col_indicator(index):
     return '{}^'.format(' ' * index)
 
 
-def load_yaml_file(search_paths, file_names):
-    """Load a project yaml file."""
+def yaml_loader():
+    """Return the libyaml safe loader if PyYAML was built with it, otherwise the pure Python one."""
+    return getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+def parse_yaml_file(file_name):
+    """Parse a yaml file.
+
+    Raises:
+        click.ClickException: if the file isn't valid yaml.
+
+    """
+    with open(file_name, 'r') as f:
+        try:
+            return yaml.load(f, Loader=yaml_loader())
+        except yaml.YAMLError as e:
+            error_string = ''
+            if hasattr(e, 'problem_mark'):
+                error_line = get_line(file_name, e.problem_mark.line)
+                col_indicator = make_col_indicator(e.problem_mark.column)
+                error_string = "invalid_syntax: '{}'\n" \
+                               "                 {}".format(error_line, col_indicator)
+            raise click.ClickException('unable to parse config file \'{}\'\n{}'.format(file_name, error_string))
+
+
+def config_cache_path(repo):
+    """Return the location of the parsed config cache for a git repo."""
+    return os.path.join(repo.git_dir, 'zazu', 'config_cache.pickle')
+
+
+def parse_cached_yaml_file(file_name, cache_path):
+    """Parse a yaml file, reusing the result saved in a cache file if the yaml file hasn't changed since.
+
+    The cache holds a single file, keyed on its path, mtime, size and inode. As with the style cache, a file modified
+    no earlier than the cache was written may have changed within the timestamp granularity and is parsed again.
+
+    Args:
+        file_name (str): the yaml file.
+        cache_path (str): the cache file, it is created or rewritten as needed.
+
+    Returns:
+        the parsed yaml.
+    """
+    key = [file_name] + zazu.style_cache.stat_key(os.stat(file_name))
+    try:
+        with open(cache_path, 'rb') as f:
+            cached_key, config = pickle.load(f)
+            written = zazu.style_cache.stat_key(os.fstat(f.fileno()))[0]
+        if cached_key == key and key[1] < written:
+            return config
+    except Exception:
+        # An unreadable cache is just a miss.
+        pass
+    config = parse_yaml_file(file_name)
+    try:
+        zazu.util.atomic_write(cache_path, lambda f: pickle.dump((key, config), f, 2), 'wb')
+    except (IOError, OSError):
+        pass
+    return config
+
+
+def load_yaml_file(search_paths, file_names, cache_path=None):
+    """Load a project yaml file.
+
+    Args:
+        search_paths (list of str): the directories to look in, in order.
+        file_names (list of str): the names the file may have, in order.
+        cache_path (str): if set, the parsed file is cached here and only parsed again once it changes.
+    """
     searched = path_gen(search_paths, file_names)
     for file_name in searched:
+        if not os.path.isfile(file_name):
+            continue
         try:
-            with open(file_name, 'r') as f:
-                try:
-                    config = yaml.load(f)
-                except yaml.YAMLError as e:
-                    if hasattr(e, 'problem_mark'):
-                        error_line = get_line(file_name, e.problem_mark.line)
-                        col_indicator = make_col_indicator(e.problem_mark.column)
-                        error_string = "invalid_syntax: '{}'\n" \
-                                       "                 {}".format(error_line, col_indicator)
-                    raise click.ClickException('unable to parse config file \'{}\'\n{}'.format(file_name, error_string))
-                return config
+            if cache_path is None:
+                return parse_yaml_file(file_name)
+            return parse_cached_yaml_file(file_name, cache_path)
         except IOError:
             pass
     # need a new generator
@@ -130,6 +215,8 @@ class Config(object):
         self._project_config = None
         self._stylers = None
         self._tc = None
+        # Set by the daemon so the style command leaves the styler workers running for the next command.
+        self.keep_workers = False
 
     def issue_tracker(self):
         """Lazily create a IssueTracker object."""
@@ -181,7 +268,8 @@ class Config(object):
         """Parse and return the zazu yaml configuration file."""
         if self._project_config is None:
             self.check_repo()
-            self._project_config = load_yaml_file([self.repo_root], PROJECT_FILE_NAMES)
+            with zazu.profiler.span('config load'):
+                self._project_config = load_yaml_file([self.repo_root], PROJECT_FILE_NAMES, config_cache_path(self.repo))
             required_zazu_version = self._project_config.get('zazu', '')
             if required_zazu_version and required_zazu_version != zazu.__version__:
                 click.secho('Warning: this repo has requested zazu {}, which doesn\'t match the installed version ({}). '
@@ -191,9 +279,18 @@ class Config(object):
     def stylers(self):
         """Lazily create Styler objects from the style config."""
         if self._stylers is None:
-            self._stylers = styler_factory(self.project_config().get('style', {}))
+            self._stylers = styler_factory(self.style_config())
         return self._stylers
 
+    def stop_workers(self):
+        """Stop the worker processes of the Stylers that have been created."""
+        for s in self._stylers or []:
+            s.stop_workers()
+
+    def style_config(self):
+        """Return the style configuration, or an empty dict if there is none."""
+        return self.project_config().get('style', {})
+
     def zazu_version_required(self):
         """Return the version of zazu requested by the config file."""
         return self.project_config().get('zazu', '')
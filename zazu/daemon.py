@@ -0,0 +1,350 @@
+# -*- coding: utf-8 -*-
+"""Background server that runs the zazu commands of the git hooks without starting a new process for each one."""
+import zazu.cli
+import zazu.config
+import zazu.daemon_client
+import zazu.style_cache
+import zazu.util
+zazu.util.lazy_import(locals(), [
+    'click',
+    'json',
+    'multiprocessing',
+    'os',
+    'socket',
+    'subprocess',
+    'sys',
+    'threading',
+    'time',
+    'traceback'
+])
+
+__author__ = "Nicholas Wiles"
+__copyright__ = "Copyright 2017"
+
+# How long "zazu daemon start" waits for the daemon to accept connections.
+START_TIMEOUT_SECONDS = 10
+
+
+class FrameWriter(object):
+    """File-like object that sends everything written to it to a daemon client as frames on one channel.
+
+    It accepts both text and bytes, and is its own binary buffer, so it can replace sys.stdout or sys.stderr.
+    """
+
+    encoding = 'utf-8'
+    errors = 'strict'
+    closed = False
+
+    def __init__(self, sock, channel, tty, lock):
+        """Constructor.
+
+        Args:
+            sock (socket.socket): the client connection.
+            channel (bytes): the channel of the frames.
+            tty (bool): whether the client's stream is a terminal, click only writes colors to terminals.
+            lock (threading.Lock): lock shared by the writers of the connection, commands may write from several threads.
+        """
+        self._sock = sock
+        self._channel = channel
+        self._tty = tty
+        self._lock = lock
+        self.buffer = self
+
+    def write(self, data):
+        """Send text or bytes to the client."""
+        if isinstance(data, type(u'')):
+            data = data.encode(self.encoding)
+        if data:
+            with self._lock:
+                zazu.daemon_client.write_frame(self._sock, self._channel, data)
+        return len(data)
+
+    def flush(self):
+        """Do nothing, writes are sent immediately."""
+        pass
+
+    def isatty(self):
+        """Return True if the client's stream is a terminal."""
+        return self._tty
+
+    def readable(self):
+        """Return False, the stream is write only."""
+        return False
+
+    def writable(self):
+        """Return True."""
+        return True
+
+    def seekable(self):
+        """Return False."""
+        return False
+
+
+class Daemon(object):
+    """Serve zazu commands for one repo on a Unix socket, one at a time.
+
+    The Config, and with it the parsed zazu.yaml, the Stylers and their worker processes, is kept between commands. It is
+    recreated when zazu.yaml changes.
+    """
+
+    def __init__(self, repo_root, idle_timeout=None):
+        """Constructor.
+
+        Args:
+            repo_root (str): the root of the repo to serve.
+            idle_timeout (int): exit after this many seconds without a request, None to run until stopped.
+        """
+        self._repo_root = repo_root
+        self._idle_timeout = idle_timeout
+        self._config = None
+        self._config_key = None
+        self._server = None
+        self._path = None
+        self._keep_workers = start_clean_workers()
+
+    def config(self):
+        """Return the Config, recreating it if the zazu config file has changed since it was loaded."""
+        key = []
+        for file_name in zazu.config.PROJECT_FILE_NAMES:
+            try:
+                key.append(zazu.style_cache.stat_key(os.stat(os.path.join(self._repo_root, file_name))))
+            except OSError:
+                key.append(None)
+        if self._config is None or key != self._config_key:
+            self.stop_workers()
+            self._config = zazu.config.Config(self._repo_root)
+            self._config.keep_workers = self._keep_workers
+            self._config_key = key
+        return self._config
+
+    def stop_workers(self):
+        """Stop the styler workers kept for later commands."""
+        if self._config is not None:
+            self._config.stop_workers()
+
+    def serve(self, path):
+        """Accept connections on a socket until stopped or idle for too long.
+
+        Raises:
+            click.ClickException: if another daemon is serving the socket.
+
+        """
+        sock = zazu.daemon_client.connect_path(path)
+        if sock is not None:
+            sock.close()
+            raise click.ClickException('a zazu daemon is already running for this repo')
+        try:
+            os.makedirs(os.path.dirname(path))
+        except OSError:
+            pass
+        try:
+            # The socket of a daemon that didn't shut down cleanly.
+            os.remove(path)
+        except OSError:
+            pass
+        self._server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._path = path
+        # Only this user may run commands in the daemon.
+        umask = os.umask(0o077)
+        try:
+            self._server.bind(path)
+        finally:
+            os.umask(umask)
+        self._server.listen(8)
+        self._server.settimeout(self._idle_timeout or None)
+        try:
+            while self._server is not None:
+                try:
+                    conn, _ = self._server.accept()
+                except socket.timeout:
+                    break
+                conn.settimeout(None)
+                try:
+                    self.handle(conn)
+                except (IOError, OSError, socket.error, ValueError):
+                    # The client went away or sent a bad request, it doesn't affect the next one.
+                    pass
+                finally:
+                    conn.close()
+        finally:
+            self.close()
+            self.stop_workers()
+
+    def close(self):
+        """Stop accepting connections, the request being handled is finished first."""
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+            try:
+                os.remove(self._path)
+            except OSError:
+                pass
+
+    def handle(self, conn):
+        """Answer one request from a client."""
+        f = conn.makefile('rb')
+        try:
+            request = json.loads(f.readline().decode('utf-8'))
+        finally:
+            f.close()
+        control = request.get('control')
+        if control == 'stop':
+            # Refuse new connections before replying, so the daemon is gone once "zazu daemon stop" returns.
+            self.close()
+            self._reply(conn, 'stopped the zazu daemon for {}\n'.format(self._repo_root), 0)
+        elif control == 'status':
+            self._reply(conn, 'zazu daemon {} is serving {}\n'.format(os.getpid(), self._repo_root), 0)
+        else:
+            self._run_command(conn, request)
+
+    @staticmethod
+    def _reply(conn, output, exit_code):
+        zazu.daemon_client.write_frame(conn, zazu.daemon_client.OUT, output.encode('utf-8'))
+        zazu.daemon_client.write_frame(conn, zazu.daemon_client.EXIT, str(exit_code).encode('ascii'))
+
+    def _run_command(self, conn, request):
+        """Run a zazu command with the client's arguments, directory, git environment variables and output streams."""
+        lock = threading.Lock()
+        tty = request.get('tty', [False, False])
+        streams = (sys.stdin, sys.stdout, sys.stderr)
+        environ = dict(os.environ)
+        cwd = os.getcwd()
+        exit_code = 0
+        try:
+            with open(os.devnull, 'r') as devnull:
+                sys.stdin = devnull
+                sys.stdout = FrameWriter(conn, zazu.daemon_client.OUT, tty[0], lock)
+                sys.stderr = FrameWriter(conn, zazu.daemon_client.ERR, tty[1], lock)
+                for k in [k for k in os.environ if k.startswith('GIT_')]:
+                    del os.environ[k]
+                os.environ.update(request.get('env', {}))
+                try:
+                    os.chdir(request['cwd'])
+                    zazu.cli.cli.main(args=request['argv'], prog_name='zazu', obj=self.config())
+                except SystemExit as e:
+                    if e.code is None or isinstance(e.code, int):
+                        exit_code = e.code or 0
+                    else:
+                        sys.stderr.write('{}\n'.format(e.code))
+                        exit_code = 1
+                except Exception:
+                    traceback.print_exc()
+                    exit_code = 1
+        finally:
+            sys.stdin, sys.stdout, sys.stderr = streams
+            os.environ.clear()
+            os.environ.update(environ)
+            os.chdir(cwd)
+        zazu.daemon_client.write_frame(conn, zazu.daemon_client.EXIT, str(exit_code).encode('ascii'))
+
+
+def start_clean_workers():
+    """Start new worker processes from a clean server process rather than forking the daemon.
+
+    A forked worker would inherit the connection and the git pipes of the command that started it, and hold them open
+    for as long as it is kept. Workers are only kept between commands where this is supported.
+
+    Returns:
+        bool: True if new workers won't be forked from the daemon.
+    """
+    try:
+        multiprocessing.set_start_method('forkserver', force=True)
+    except (AttributeError, ValueError):
+        return False
+    return True
+
+
+def check_platform():
+    """Raise a ClickException if the platform has no Unix domain sockets."""
+    if not hasattr(socket, 'AF_UNIX'):
+        raise click.ClickException('the zazu daemon requires Unix domain sockets, which this platform doesn\'t have')
+
+
+def send_control(ctx, control):
+    """Send a control request to the daemon of the repo and exit with its result, or 1 if it isn't running."""
+    ctx.obj.check_repo()
+    sock = zazu.daemon_client.connect(ctx.obj.repo.git_dir)
+    if sock is None:
+        click.echo('no zazu daemon is running for {}'.format(ctx.obj.repo_root))
+        ctx.exit(1)
+    try:
+        exit_code = zazu.daemon_client.request(sock, {'control': control})
+    finally:
+        sock.close()
+    ctx.exit(exit_code)
+
+
+@click.group(short_help='Serve the git hooks from a background process.')
+def daemon():
+    """Serve the git hooks from a background process.
+
+    The daemon keeps the repo's config, stylers and styler worker processes loaded between commands. The git hooks send
+    their commands to it when it is running and run them in a new zazu process when it isn't.
+    """
+    pass
+
+
+@daemon.command()
+@click.option('--idle-timeout', type=click.IntRange(0), default=3600, show_default=True,
+              help='exit after this many seconds without a request, 0 to run until stopped')
+@click.pass_context
+def run(ctx, idle_timeout):
+    """Run the daemon in the foreground."""
+    check_platform()
+    ctx.obj.check_repo()
+    try:
+        path = zazu.daemon_client.socket_path(ctx.obj.repo.git_dir)
+    except OSError as e:
+        raise click.ClickException(str(e))
+    Daemon(ctx.obj.repo_root, idle_timeout).serve(path)
+
+
+@daemon.command()
+@click.option('--idle-timeout', type=click.IntRange(0), default=3600, show_default=True,
+              help='exit after this many seconds without a request, 0 to run until stopped')
+@click.pass_context
+def start(ctx, idle_timeout):
+    """Start the daemon in the background, its output is written to the zazu/daemon.log file in the git dir."""
+    check_platform()
+    ctx.obj.check_repo()
+    git_dir = ctx.obj.repo.git_dir
+    sock = zazu.daemon_client.connect(git_dir)
+    if sock is not None:
+        sock.close()
+        click.echo('the zazu daemon is already running for {}'.format(ctx.obj.repo_root))
+        return
+    log_path = os.path.join(git_dir, 'zazu', 'daemon.log')
+    try:
+        os.makedirs(os.path.dirname(log_path))
+    except OSError:
+        pass
+    with open(os.devnull, 'r') as devnull, open(log_path, 'a') as log:
+        # A new session so the daemon outlives the terminal that started it.
+        process = subprocess.Popen([sys.executable, '-m', 'zazu.cli', 'daemon', 'run', '--idle-timeout', str(idle_timeout)],
+                                   cwd=ctx.obj.repo_root, stdin=devnull, stdout=log, stderr=log, close_fds=True,
+                                   preexec_fn=os.setsid)
+    deadline = time.time() + START_TIMEOUT_SECONDS
+    while time.time() < deadline:
+        sock = zazu.daemon_client.connect(git_dir)
+        if sock is not None:
+            sock.close()
+            click.echo('started the zazu daemon for {}'.format(ctx.obj.repo_root))
+            return
+        if process.poll() is not None:
+            break
+        time.sleep(0.05)
+    raise click.ClickException('the zazu daemon didn\'t start, see {}'.format(log_path))
+
+
+@daemon.command()
+@click.pass_context
+def stop(ctx):
+    """Stop the daemon."""
+    send_control(ctx, 'stop')
+
+
+@daemon.command()
+@click.pass_context
+def status(ctx):
+    """Check whether the daemon is running, exiting with 1 if it isn't."""
+    send_control(ctx, 'status')
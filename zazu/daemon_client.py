@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""Thin client that sends a zazu command to the repo's zazu daemon, used by the git hooks.
+
+Starting the client only imports the standard library, the rest of zazu is imported if no daemon is running and the
+command is run in this process instead.
+
+The client writes one JSON request line to the daemon's socket. The daemon answers with frames made of a one byte
+channel, a four byte big endian length and the payload: the channels are OUT and ERR for output and EXIT for the ascii
+exit code, which is always the last frame.
+"""
+import hashlib
+import json
+import os
+import socket
+import stat
+import struct
+import subprocess
+import sys
+import tempfile
+
+__author__ = "Nicholas Wiles"
+__copyright__ = "Copyright 2017"
+
+OUT = b'o'
+ERR = b'e'
+EXIT = b'x'
+# The longest Unix socket path that works everywhere, macOS allows 104 bytes including the terminating null.
+MAX_SOCKET_PATH = 100
+
+
+def private_temp_dir():
+    """Return a directory in the temp dir that only the current user can access, creating it if needed.
+
+    Raises:
+        OSError: if the directory exists but belongs to another user or is accessible to others.
+
+    """
+    uid = os.getuid()
+    path = os.path.join(tempfile.gettempdir(), 'zazu-{}'.format(uid))
+    try:
+        os.mkdir(path, 0o700)
+    except OSError:
+        pass
+    # Another user could have created it first, don't put the socket anywhere they can replace it.
+    st = os.lstat(path)
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != uid or st.st_mode & 0o077:
+        raise OSError('{} must be a directory that only belongs to and is only accessible by this user'.format(path))
+    return path
+
+
+def socket_path(git_dir):
+    """Return the path of the daemon socket for a git dir.
+
+    The socket lives in the git dir unless that path is too long for a Unix socket, then it goes in a private directory in
+    the temp dir.
+
+    Raises:
+        OSError: if the private directory can't be used, see private_temp_dir.
+
+    """
+    git_dir = os.path.realpath(git_dir)
+    path = os.path.join(git_dir, 'zazu', 'daemon.sock')
+    if len(path) > MAX_SOCKET_PATH:
+        digest = hashlib.sha1(git_dir.encode('utf-8')).hexdigest()[:16]
+        path = os.path.join(private_temp_dir(), '{}.sock'.format(digest))
+    return path
+
+
+def find_git_dir():
+    """Return the git dir of the current directory's repo, or None if it isn't in one."""
+    # Git sets GIT_DIR when it runs some hooks.
+    git_dir = os.environ.get('GIT_DIR')
+    if git_dir:
+        return os.path.abspath(git_dir)
+    try:
+        with open(os.devnull, 'w') as devnull:
+            git_dir = subprocess.check_output(['git', 'rev-parse', '--git-dir'], stderr=devnull)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return os.path.abspath(git_dir.decode('utf-8').strip())
+
+
+def write_frame(sock, channel, payload):
+    """Send a frame to a client."""
+    sock.sendall(channel + struct.pack('>I', len(payload)) + payload)
+
+
+def read_exactly(sock, size):
+    """Read size bytes from a socket, or fewer if it is closed first."""
+    chunks = []
+    while size:
+        chunk = sock.recv(min(size, 65536))
+        if not chunk:
+            break
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b''.join(chunks)
+
+
+def read_frames(sock):
+    """Generate the (channel, payload) frames sent by the daemon until the socket is closed."""
+    while True:
+        header = read_exactly(sock, 5)
+        if len(header) < 5:
+            return
+        payload_size = struct.unpack('>I', header[1:])[0]
+        yield header[:1], read_exactly(sock, payload_size)
+
+
+def connect(git_dir):
+    """Connect to the daemon of a git dir, returning None if it isn't running."""
+    try:
+        path = socket_path(git_dir)
+    except OSError:
+        return None
+    return connect_path(path)
+
+
+def connect_path(path):
+    """Connect to the daemon listening on a socket, returning None if it isn't running.
+
+    Sockets that belong to another user are ignored, their output and exit codes can't be trusted.
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    try:
+        if os.stat(path).st_uid != os.getuid():
+            return None
+    except OSError:
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error:
+        sock.close()
+        return None
+    return sock
+
+
+def request(sock, message):
+    """Send a request to the daemon and return the exit code, copying the output frames to stdout and stderr.
+
+    Raises:
+        IOError: if the daemon closes the connection without sending an exit code.
+
+    """
+    sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+    streams = {OUT: sys.stdout, ERR: sys.stderr}
+    for channel, payload in read_frames(sock):
+        if channel == EXIT:
+            return int(payload)
+        stream = streams[channel]
+        stream.flush()
+        getattr(stream, 'buffer', stream).write(payload)
+        stream.flush()
+    raise IOError('the zazu daemon stopped before finishing the command')
+
+
+def command_request(argv):
+    """Return the request that runs a zazu command in the daemon as if it was run here."""
+    # The hooks depend on the variables git sets for them, like GIT_INDEX_FILE for "git commit <path>".
+    env = {k: v for k, v in os.environ.items() if k.startswith('GIT_')}
+    return {'argv': list(argv), 'cwd': os.getcwd(), 'env': env,
+            'tty': [sys.stdout.isatty(), sys.stderr.isatty()]}
+
+
+def main(argv=None):
+    """Run a zazu command in the daemon if it is running, otherwise in this process."""
+    argv = sys.argv[1:] if argv is None else argv
+    git_dir = find_git_dir()
+    sock = connect(git_dir) if git_dir else None
+    if sock is None:
+        import zazu.cli
+        zazu.cli.cli(args=argv, prog_name='zazu')
+        return
+    try:
+        exit_code = request(sock, command_request(argv))
+    except (IOError, socket.error) as e:
+        sys.stderr.write('Error: {}\n'.format(e))
+        exit_code = 1
+    finally:
+        sock.close()
+    sys.exit(exit_code)
+
+
+if __name__ == '__main__':
+    main()
@@ -94,7 +94,7 @@ def make_issue_descriptor(name):
     return IssueDescriptor(type, id, description)
 
 
-@click.group()
+@click.group(short_help='Create or update work items.')
 @click.pass_context
 def dev(ctx):
     """Create or update work items."""
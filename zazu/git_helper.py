@@ -1,12 +1,16 @@
 # -*- coding: utf-8 -*-
 """Git functions for zazu."""
+import zazu.profiler
 import zazu.util
 zazu.util.lazy_import(locals(), [
     'filecmp',
     'git',
     'os',
     'pkg_resources',
-    'shutil'
+    're',
+    'shutil',
+    'subprocess',
+    'threading'
 ])
 
 
@@ -43,7 +47,92 @@ def get_default_git_hooks():
 
 def get_touched_files(repo):
     """Get list of files that are scheduled to be committed (Added, created, modified, or renamed)."""
-    return [file for file in repo.git.diff('--cached', '--name-only', '--diff-filter=ACMR').split('\n') if file]
+    return get_diff_files(repo, '--cached')
+
+
+def get_staged_line_ranges(repo_base):
+    """Get the lines of each staged file that differ from HEAD, as listed by the hunks of "git diff --cached -U0".
+
+    Args:
+        repo_base (str): the root directory of the git repo.
+
+    Returns:
+        dict: maps the path of each modified file to a list of (first, last) 1-based line ranges of its staged version,
+            which is empty if lines were only removed. Added files map to None, every line of them is new. Files whose
+            path can't be read from the diff, like those git quotes, are left out.
+
+    """
+    args = ['git', '-c', 'core.quotepath=off', 'diff', '--cached', '-U0', '--no-color', '--no-ext-diff',
+            '--src-prefix=a/', '--dst-prefix=b/']
+    output = zazu.util.check_output(args, cwd=repo_base)
+    hunk_header = re.compile(br'^@@ -\d+(?:,(\d+))? \+(\d+)(?:,(\d+))? @@')
+    ranges = {}
+    path = None
+    added = False
+    # The number of lines of the current hunk that are still to come, they could look like headers.
+    hunk_lines = 0
+    for line in output.split(b'\n'):
+        if line.startswith(b'\\'):
+            # "\ No newline at end of file"
+            continue
+        if hunk_lines:
+            hunk_lines -= 1
+        elif line.startswith(b'--- '):
+            added = line == b'--- /dev/null'
+        elif line.startswith(b'+++ '):
+            path = line[len(b'+++ b/'):].decode('utf-8') if line.startswith(b'+++ b/') else None
+            if path is not None:
+                path = os.path.normpath(path)
+                ranges[path] = None if added else []
+        elif line.startswith(b'@@ '):
+            match = hunk_header.match(line)
+            removed_count = int(match.group(1) or 1)
+            first, count = int(match.group(2)), int(match.group(3) or 1)
+            hunk_lines = removed_count + count
+            if path is not None and ranges[path] is not None and count:
+                ranges[path].append((first, first + count - 1))
+    return ranges
+
+
+def get_changed_files(repo, base, pathspec=None):
+    """Get list of files that HEAD changed (Added, created, modified, or renamed) since it diverged from base."""
+    return get_diff_files(repo, '{}...HEAD'.format(base), '--', *(pathspec or []))
+
+
+def get_diff_files(repo, *args):
+    """Get list of files reported by git diff that were Added, created, modified, or renamed."""
+    args = ['--name-only', '--diff-filter=ACMR'] + list(args)
+    with zazu.profiler.span('subprocess git diff', 'subprocess', argv=['git', 'diff'] + args):
+        output = repo.git.diff(*args)
+    return [file for file in output.split('\n') if file]
+
+
+def get_tracked_files(repo_base, pathspec=None):
+    """Get list of files tracked in the git index, optionally limited to a pathspec.
+
+    Args:
+        repo_base (str): the root directory of the git repo.
+        pathspec (list of str): limit the files to these git pathspecs (relative to repo_base).
+
+    Returns:
+        list of str: file paths relative to repo_base, excluding submodules and files deleted from the working tree.
+
+    """
+    def ls_files(*args):
+        output = zazu.util.check_output(['git', 'ls-files', '-z'] + list(args) + ['--'] + list(pathspec or []),
+                                        cwd=repo_base)
+        return output.decode('utf-8').split('\0')[:-1]
+
+    deleted = set(ls_files('--deleted'))
+    files = []
+    seen = set()
+    for entry in ls_files('--stage'):
+        info, path = entry.split('\t', 1)
+        # Skip submodules (gitlinks) and duplicate entries from merge conflicts.
+        if not info.startswith('160000') and path not in deleted and path not in seen:
+            seen.add(path)
+            files.append(path)
+    return files
 
 
 def check_git_hooks(repo_base):
@@ -109,3 +198,80 @@ def filter_undeletable(branches):
 def read_staged(path):
     """Read the contents of the staged version of the file."""
     return zazu.util.check_output(['git', 'show', ':{}'.format(path)])
+
+
+def get_staged_object_ids(repo_base):
+    """Get a dict mapping each path in the git index to the object id of its staged contents."""
+    output = zazu.util.check_output(['git', 'ls-files', '--stage', '-z'], cwd=repo_base).decode('utf-8')
+    ids = {}
+    for entry in output.split('\0')[:-1]:
+        info, path = entry.split('\t', 1)
+        mode, object_id, stage = info.split()
+        # Conflicted files have no single staged version.
+        if stage == '0':
+            ids[path] = object_id
+    return ids
+
+
+class StagedFileReader(object):
+    """Read staged file contents through a single "git cat-file --batch" process rather than a git process per file.
+
+    May be used as a context manager to close the git process when done.
+    """
+
+    def __init__(self, repo_base):
+        """Constructor.
+
+        Args:
+            repo_base (str): the root directory of the git repo.
+        """
+        self._repo_base = repo_base
+        self._object_ids = None
+        self._process = None
+        self._lock = threading.Lock()
+
+    def read(self, path):
+        """Read the contents of the staged version of the file, has the same return as read_staged."""
+        with self._lock:
+            if self._object_ids is None:
+                self._object_ids = get_staged_object_ids(self._repo_base)
+            object_id = self._object_ids.get(path.replace(os.sep, '/'))
+            if object_id is None:
+                return read_staged(path)
+            if self._process is None:
+                try:
+                    self._process = subprocess.Popen(['git', 'cat-file', '--batch'], cwd=self._repo_base,
+                                                     stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+                except OSError:
+                    zazu.util.raise_uninstalled('git')
+            with zazu.profiler.span('git cat-file read', 'subprocess', path=path):
+                self._process.stdin.write('{}\n'.format(object_id).encode('utf-8'))
+                self._process.stdin.flush()
+                header = self._process.stdout.readline().split()
+                if len(header) != 3:
+                    raise zazu.ZazuException('unable to read staged contents of "{}"'.format(path))
+                contents = self._process.stdout.read(int(header[2]))
+                self._process.stdout.read(1)  # Trailing newline.
+            return contents
+
+    def refresh(self):
+        """Forget the staged object ids, must be called after the staging area has been changed."""
+        with self._lock:
+            self._object_ids = None
+
+    def close(self):
+        """Stop the git process."""
+        with self._lock:
+            if self._process is not None:
+                self._process.stdin.close()
+                self._process.wait()
+                self._process.stdout.close()
+                self._process = None
+
+    def __enter__(self):
+        """Return self for use in a with statement."""
+        return self
+
+    def __exit__(self, type, value, traceback):
+        """Close the reader."""
+        self.close()
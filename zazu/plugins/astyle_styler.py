@@ -2,7 +2,7 @@
 """astyle plugin for zazu."""
 import zazu.styler
 zazu.util.lazy_import(locals(), [
-    'subprocess'
+    'os'
 ])
 
 __author__ = "Nicholas Wiles"
@@ -12,11 +12,56 @@ __copyright__ = "Copyright 2017"
 class AstyleStyler(zazu.styler.Styler):
     """Astyle plugin for code styling."""
 
+    batch_size = 50
+
+    def __init__(self, *args, **kwargs):
+        """Constructor, see Styler."""
+        super(AstyleStyler, self).__init__(*args, **kwargs)
+        self._config_files = None
+
     def style_string(self, string):
         """Fix a string to be within style guidelines."""
         args = ['astyle'] + self.options
         return zazu.util.check_popen(args=args, stdin_str=string)
 
+    def style_files(self, paths, fix=False):
+        """Check or fix many files with a single astyle invocation."""
+        if not paths:
+            return []
+        if fix:
+            return zazu.styler.fix_in_place(['astyle', '--suffix=none'] + self.options, paths)
+        # Quiet mode would hide the report we rely on to find the violations.
+        options = [o for o in self.options if o not in ['-q', '--quiet']]
+        args = ['astyle', '--dry-run', '--formatted'] + options + paths
+        output = zazu.util.check_popen(args=args, env=dict(os.environ, LC_ALL='C')).decode('utf-8')
+        formatted = set(os.path.abspath(line.split(None, 1)[1]) for line in output.splitlines()
+                        if line.startswith('Formatted'))
+        return [(p, os.path.abspath(p) in formatted) for p in paths]
+
+    def config_files(self, path):
+        """Return the option files astyle reads, named by --options and --project or their environment variables."""
+        cwd = os.getcwd()
+        if self._config_files is None or self._config_files[0] != cwd:
+            options = dict(o.split('=', 1) for o in self.options if o.startswith(('--options=', '--project=')))
+            option_file = options.get('--options', os.environ.get('ARTISTIC_STYLE_OPTIONS'))
+            if option_file is None:
+                files = [os.path.expanduser(os.path.join('~', n)) for n in ['.astylerc', os.path.join('.config', 'astylerc')]]
+            else:
+                files = [] if option_file == 'none' else [option_file]
+            project = options.get('--project', '.astylerc' if '--project' in self.options else None)
+            if project is None:
+                project = os.environ.get('ARTISTIC_STYLE_PROJECT_OPTIONS')
+            if project is not None and project != 'none':
+                names = ['.astylerc', '_astylerc'] if project == '.astylerc' else [project]
+                files += [os.path.join(d, n) for d in zazu.styler.parent_dirs(cwd) for n in names]
+            # Files that don't exist yet are listed too, creating one changes the fingerprint.
+            self._config_files = (cwd, [os.path.abspath(f) for f in files])
+        return self._config_files[1]
+
+    def version(self):
+        """Return the version string reported by astyle."""
+        return zazu.styler.probe_version(['astyle', '--version'])
+
     @staticmethod
     def default_extensions():
         """Return the list of file extensions that are compatible with this Styler."""
@@ -3,6 +3,11 @@
 import zazu.styler
 import zazu.util
 zazu.util.lazy_import(locals(), [
+    'autopep8',
+    'concurrent.futures',
+    'copy',
+    'io',
+    'os',
     'subprocess'
 ])
 
@@ -10,13 +15,161 @@ __author__ = "Nicholas Wiles"
 __copyright__ = "Copyright 2016"
 
 
+def source_encoding(source):
+    """Return the encoding of Python source bytes, as declared by its coding cookie or BOM."""
+    try:
+        from tokenize import detect_encoding
+    except ImportError:
+        from lib2to3.pgen2.tokenize import detect_encoding
+    return detect_encoding(io.BytesIO(source).readline)[0]
+
+
+# The parsed autopep8 options, keyed by the flags, the current directory and the fingerprint of the config files.
+_parsed_options = {}
+
+
+def parse_options(options, config_key=None):
+    """Parse autopep8 command line flags and the config files they apply, reusing the result for the same flags.
+
+    Args:
+        options (tuple of str): autopep8 command line flags.
+        config_key (str): identifies the contents of the config files, the options are parsed again when it changes.
+
+    Returns:
+        a copy of the parsed options, autopep8.fix_code modifies the options it is given.
+    """
+    key = (options, os.getcwd(), config_key)
+    parsed = _parsed_options.get(key)
+    if parsed is None:
+        parsed = _parsed_options.setdefault(key, autopep8.parse_args(list(options) + ['-'], apply_config=True))
+    return copy.copy(parsed)
+
+
+def fix_string(string, options, config_key=None, line_range=None):
+    """Fix a string with autopep8 in the calling process.
+
+    Args:
+        string (str): the string to fix, if it is encoded the result is encoded the same way.
+        options (tuple of str): autopep8 command line flags.
+        config_key (str): identifies the contents of the config files, see parse_options.
+        line_range (tuple of int): the (first, last) 1-based lines to fix, None to fix them all. It is set on the parsed
+            options rather than passed as a flag so it doesn't add an entry to the options cache.
+
+    Returns:
+        str: the fixed string.
+
+    """
+    if isinstance(string, bytes):
+        encoding = source_encoding(string)
+        return fix_string(string.decode(encoding), options, config_key, line_range).encode(encoding)
+    parsed = parse_options(options, config_key)
+    if line_range is not None:
+        # autopep8 updates the range as fixes add or remove lines, give it a list of its own.
+        parsed.line_range = list(line_range)
+    return autopep8.fix_code(string, options=parsed)
+
+
 class Autopep8Styler(zazu.styler.Styler):
     """Autopep8 plugin for code styling."""
 
+    # Run autopep8 in this process rather than launching it for each string when there are no workers.
+    in_process = False
+
+    def __init__(self, *args, **kwargs):
+        """Constructor, see Styler."""
+        super(Autopep8Styler, self).__init__(*args, **kwargs)
+        self._pool = None
+        self._futures = set()
+        self._config_files = None
+
     def style_string(self, string):
         """Fix a string to be within style guidelines."""
-        args = ['autopep8'] + self.options + ['-']
-        return zazu.util.check_popen(args=args, stdin_str=string)
+        return self._fix(string, self.options)
+
+    def style_lines(self, string, lines):
+        """Fix some lines of a string to be within style guidelines.
+
+        autopep8 takes a single line range, and each run parses and checks the whole string however small the range is, so
+        the lines from the start of the first range to the end of the last are fixed in one run. This costs about as much
+        as style_string, and the unchanged lines between the ranges are fixed too.
+        """
+        if not lines:
+            return string
+        return self._fix(string, self.options, (min(first for first, _ in lines), max(last for _, last in lines)))
+
+    def _fix(self, string, options, line_range=None):
+        pool = self._pool
+        if pool is not None:
+            future = pool.submit(fix_string, string, tuple(options), self.fingerprint(), line_range)
+            self._futures.add(future)
+            try:
+                return future.result()
+            finally:
+                self._futures.discard(future)
+        if self.in_process:
+            return fix_string(string, tuple(options), self.fingerprint(), line_range)
+        if line_range is not None:
+            options = options + ['--line-range', str(line_range[0]), str(line_range[1])]
+        args = ['autopep8'] + options + ['-']
+        # autopep8 decodes stdin and encodes stdout with the stdio encoding, make it match the source's.
+        env = dict(os.environ, PYTHONIOENCODING=source_encoding(string))
+        return zazu.util.check_popen(args=args, stdin_str=string, env=env)
+
+    def start_workers(self, count):
+        """Start a pool of processes that run autopep8 in-process, avoiding an interpreter launch per string."""
+        if self._pool is None:
+            self._pool = concurrent.futures.ProcessPoolExecutor(max_workers=count)
+            # The workers run the imported autopep8 rather than the executable, see version.
+            self._fingerprint = None
+
+    def stop_workers(self, cancel=False):
+        """Shut down the worker pool.
+
+        Cancelling drops the calls that are still queued, they raise CancelledError, and lets the calls that have been
+        handed to a worker finish. Terminating the workers instead would leave the callers of those calls waiting forever
+        on executors without broken pool detection, like the Python 2 backport.
+        """
+        if self._pool is not None:
+            if cancel:
+                for future in list(self._futures):
+                    future.cancel()
+            self._pool.shutdown(wait=not cancel)
+            self._pool = None
+            self._fingerprint = None
+
+    def config_files(self, path):
+        """Return the global config file and the project config files autopep8 looks for from the current directory up."""
+        cwd = os.getcwd()
+        if self._config_files is None or self._config_files[0] != cwd:
+            files = [os.path.abspath(os.path.expanduser(zazu.styler.option_value(self.options, ['--global-config']) or
+                                                        autopep8.DEFAULT_CONFIG))]
+            if '--ignore-local-config' not in self.options:
+                names = autopep8.PROJECT_CONFIG + ('pyproject.toml',)
+                files += [os.path.join(d, n) for d in zazu.styler.parent_dirs(cwd) for n in names]
+            # Files that don't exist yet are listed too, creating one changes the fingerprint.
+            self._config_files = (cwd, files)
+        return self._config_files[1]
+
+    @classmethod
+    def from_config(cls, config, excludes, includes):
+        """Create an Autopep8Styler from a configuration dictionary, see Styler.from_config.
+
+        The "inProcess" setting runs autopep8 in the zazu process, rather than launching it for each file, when styler
+        workers aren't used.
+        """
+        obj = super(Autopep8Styler, cls).from_config(config, excludes, includes)
+        obj.in_process = config.get('inProcess', cls.in_process)
+        return obj
+
+    def version(self):
+        """Return the version of the autopep8 that styles the strings.
+
+        That is the imported module in-process and in the workers, otherwise it is the executable on the PATH, which may
+        be another install.
+        """
+        if self._pool is not None or self.in_process:
+            return autopep8.__version__
+        return zazu.styler.probe_version(['autopep8', '--version'])
 
     @staticmethod
     def default_extensions():
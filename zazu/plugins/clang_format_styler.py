@@ -3,6 +3,7 @@
 import zazu.styler
 import zazu.util
 zazu.util.lazy_import(locals(), [
+    'os',
     'subprocess'
 ])
 
@@ -13,11 +14,56 @@ __copyright__ = "Copyright 2017"
 class ClangFormatStyler(zazu.styler.Styler):
     """ClangFormat plugin for code styling."""
 
+    batch_size = 50
+
+    def __init__(self, *args, **kwargs):
+        """Constructor, see Styler."""
+        super(ClangFormatStyler, self).__init__(*args, **kwargs)
+        self._config_dirs = {}
+
     def style_string(self, string):
         """Fix a string to be within style guidelines."""
         args = ['clang-format'] + self.options
         return zazu.util.check_popen(args=args, stdin_str=string)
 
+    def style_lines(self, string, lines):
+        """Fix some lines of a string to be within style guidelines, clang-format may also adjust the lines around them."""
+        if not lines:
+            return string
+        args = ['clang-format'] + ['-lines={}:{}'.format(first, last) for first, last in lines] + self.options
+        return zazu.util.check_popen(args=args, stdin_str=string)
+
+    def style_files(self, paths, fix=False):
+        """Check or fix many files with a single clang-format invocation."""
+        if not paths:
+            return []
+        if fix:
+            return zazu.styler.fix_in_place(['clang-format', '-i'] + self.options, paths)
+        args = ['clang-format', '-output-replacements-xml'] + self.options + paths
+        # clang-format emits one XML document per file, in order, only listing replacements that change the file.
+        documents = zazu.util.check_popen(args=args).decode('utf-8').split('<?xml')[1:]
+        return [(p, '<replacement ' in d) for p, d in zip(paths, documents)]
+
+    def config_files(self, path):
+        """Return the style file named by -style=file:<path>, or the .clang-format files in the directories above path."""
+        style = zazu.styler.option_value(self.options, ['-style', '--style']) or 'file'
+        if style.startswith('file:'):
+            return [os.path.abspath(style[len('file:'):])]
+        if style != 'file':
+            return []
+        # Styling stdin uses the configuration from the current directory, include it along with the file's.
+        directory = os.path.dirname(os.path.abspath(path)) if path else os.getcwd()
+        files = self._config_dirs.get(directory)
+        if files is None:
+            dirs = set(zazu.styler.parent_dirs(directory) + zazu.styler.parent_dirs(os.getcwd()))
+            # Files that don't exist yet are listed too, creating one changes the fingerprint.
+            files = self._config_dirs[directory] = [os.path.join(d, n) for d in sorted(dirs) for n in ['.clang-format', '_clang-format']]
+        return files
+
+    def version(self):
+        """Return the version string reported by clang-format."""
+        return zazu.styler.probe_version(['clang-format', '--version'])
+
     @staticmethod
     def default_extensions():
         """Return the list of file extensions that are compatible with this Styler."""
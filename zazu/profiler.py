@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+"""Record timing spans for profiling zazu commands.
+
+Profiling is off until enable() is called and span() does nearly nothing until then. zazu.util times its subprocesses
+with this module, so it only imports from the standard library.
+"""
+import collections
+import contextlib
+import functools
+import os
+import threading
+import time
+
+__author__ = "Nicholas Wiles"
+__copyright__ = "Copyright 2017"
+
+Span = collections.namedtuple('Span', ['name', 'category', 'start', 'duration', 'thread', 'args'])
+
+# The spans recorded so far, None while profiling is disabled.
+_spans = [None]
+
+
+def enable():
+    """Start recording spans, discarding any that were recorded before."""
+    _spans[0] = []
+    _instrument_requests()
+
+
+def disable():
+    """Stop recording spans."""
+    _spans[0] = None
+
+
+def enabled():
+    """Return True if spans are being recorded."""
+    return _spans[0] is not None
+
+
+def spans():
+    """Return the spans recorded since profiling was enabled."""
+    return list(_spans[0] or [])
+
+
+@contextlib.contextmanager
+def span(name, category='zazu', **args):
+    """Time the code run in a with block as a span.
+
+    Args:
+        name (str): the name of the span, the summary adds up the spans with the same name.
+        category (str): the kind of work being done.
+        args: details about this particular span, shown in the trace.
+    """
+    recorded = _spans[0]
+    if recorded is None:
+        yield
+        return
+    start = time.time()
+    try:
+        yield
+    finally:
+        recorded.append(Span(name, category, start, time.time() - start, threading.current_thread().ident, args))
+
+
+def profiled(name, category='zazu'):
+    """Decorate a function to time each of its calls as a span."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, category):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def subprocess_span(args):
+    """Return a span timing a subprocess run with the args passed to subprocess.Popen."""
+    if not enabled():
+        return span(None)
+    if isinstance(args, (list, tuple)):
+        words = [os.path.basename(args[0])] + [a for a in args[1:2] if not a.startswith('-')]
+        argv = list(args)
+    else:
+        words = ['shell']
+        argv = [args]
+    return span('subprocess {}'.format(' '.join(words)), 'subprocess', argv=argv)
+
+
+def summary():
+    """Return (name, count, total seconds, longest seconds) for each span name, largest total first."""
+    totals = collections.OrderedDict()
+    for s in spans():
+        count, total, longest = totals.get(s.name, (0, 0.0, 0.0))
+        totals[s.name] = (count + 1, total + s.duration, max(longest, s.duration))
+    return sorted(((name,) + values for name, values in totals.items()), key=lambda row: -row[2])
+
+
+def format_summary():
+    """Return the summary as a table."""
+    rows = summary()
+    width = max([len('span')] + [len(row[0]) for row in rows])
+    lines = ['{:<{width}}  {:>6}  {:>10}  {:>10}'.format('span', 'count', 'total (s)', 'max (s)', width=width)]
+    for name, count, total, longest in rows:
+        lines.append('{:<{width}}  {:>6}  {:>10.3f}  {:>10.3f}'.format(name, count, total, longest, width=width))
+    return '\n'.join(lines)
+
+
+def write_chrome_trace(path):
+    """Write the recorded spans to a file in the Chrome trace event format, viewable in chrome://tracing or Perfetto."""
+    import json
+    pid = os.getpid()
+    events = [{'name': s.name, 'cat': s.category, 'ph': 'X', 'ts': int(s.start * 1e6), 'dur': int(s.duration * 1e6),
+               'pid': pid, 'tid': s.thread, 'args': s.args} for s in spans()]
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+
+
+def _instrument_requests():
+    """Time every HTTP request made through the requests package, which the REST based plugins use."""
+    try:
+        import requests
+    except ImportError:
+        return
+    send = requests.Session.send
+    if getattr(send, 'profiled', False):
+        return
+
+    def profiled_send(self, request, **kwargs):
+        # Leave out the query string, it may hold credentials.
+        with span('http {}'.format(request.method), 'http', url=request.url.split('?', 1)[0]):
+            return send(self, request, **kwargs)
+    profiled_send.profiled = True
+    requests.Session.send = profiled_send
@@ -15,7 +15,7 @@ __author__ = "Nicholas Wiles"
 __copyright__ = "Copyright 2016"
 
 
-@click.group()
+@click.group(short_help='Manage repository.')
 @click.pass_context
 def repo(ctx):
     """Manage repository."""
@@ -1,12 +1,17 @@
 # -*- coding: utf-8 -*-
 """Style functions for zazu."""
 import zazu.git_helper
+import zazu.profiler
+import zazu.style_cache
 import zazu.styler
 import zazu.util
+import zazu.watch
 zazu.util.lazy_import(locals(), [
     'click',
     'difflib',
     'functools',
+    'git',
+    'itertools',
     'os',
     'threading'
 ])
@@ -21,48 +26,121 @@ default_exclude_paths = ['build',
 
 
 def read_file(path):
-    """Read a file and return its contents as a string."""
-    with open(path, 'r') as f:
+    """Read a file and return its contents as bytes."""
+    with open(path, 'rb') as f:
         return f.read()
 
 
 def write_file(path, _, styled_string):
-    """Write styled_string string to a file."""
-    with open(path, 'w') as f:
+    """Write styled_string bytes to a file."""
+    with open(path, 'wb') as f:
         return f.write(styled_string)
 
 
-git_lock = threading.Lock()
+def unified_diff(path, input_string, styled_string):
+    """Generate the lines of a unified diff from the input to the styled version of a file.
 
+    Lines without a trailing newline are marked the same way git marks them, so the diff can be applied with git apply.
+    """
+    input_lines = input_string.splitlines(True)
+    styled_lines = styled_string.splitlines(True)
+    if isinstance(input_string, bytes) and hasattr(difflib, 'diff_bytes'):
+        lines = difflib.diff_bytes(difflib.unified_diff, input_lines, styled_lines,
+                                   ('a/' + path).encode('utf-8'), ('b/' + path).encode('utf-8'))
+        newline = b'\n'
+        no_newline = b'\n\\ No newline at end of file\n'
+    else:
+        lines = difflib.unified_diff(input_lines, styled_lines, 'a/' + path, 'b/' + path)
+        newline = '\n'
+        no_newline = '\n\\ No newline at end of file\n'
+    for line in lines:
+        yield line if line.endswith(newline) else line + no_newline
 
-def stage_patch(path, input_string, styled_string):
-    """Create a patch between input_string and output_string and add the patch to the git staging area.
 
-    Args:
-        path: the path of the file being patched.
-        input_string: the current state of the file in the git stage.
-        styled_string: the properly styled string to stage.
+class DiffPrinter(object):
+    """Print a unified diff of each styled file as it is styled.
+
+    Instances are used as the write function for style_file, optionally passing the styled file on to another write
+    function. Each diff is written in chunks of about buffer_size characters as it is generated, and is printed whole so
+    the diffs of files styled in parallel don't interleave.
     """
-    # If the input was the same as the current file contents, apply the styling locally and add it.
-    if read_file(path) == input_string:
-        write_file(path, '', styled_string)
-        with git_lock:
-            zazu.util.check_output(['git', 'add', path])
-    else:
-        # The file is partially staged. We must apply a patch to the staging area.
-        input_lines = input_string.splitlines()
-        styled_lines = styled_string.splitlines()
-        patch = difflib.unified_diff(input_lines, styled_lines, 'a/' + path, 'b/' + path, lineterm='')
-        patch_string = '\n'.join(patch) + '\n'
-        if input_string[-1] != '\n':
-            # This is to address a bizarre issue with git apply whereby if the staged file doesn't end in a newline,
-            # the patch will fail to apply.
-            raise click.ClickException('File "{}" must have a trailing newline'.format(path))
-        with git_lock:
-            zazu.util.check_popen(args=['git', 'apply', '--cached', '--verbose', '-'], stdin_str=patch_string)
-
-
-def style_file(styler, path, read_fn, write_fn):
+
+    def __init__(self, write_fn=None, buffer_size=65536):
+        """Constructor.
+
+        Args:
+            write_fn: function called with the styled file after its diff is printed, or None.
+            buffer_size (int): the number of characters buffered before they are written.
+        """
+        self._lock = threading.Lock()
+        self._write_fn = write_fn
+        self._buffer_size = buffer_size
+
+    def __call__(self, path, input_string, styled_string):
+        """Print the diff from input_string to styled_string for a file."""
+        with self._lock:
+            buffer = []
+            size = 0
+            for line in unified_diff(path, input_string, styled_string):
+                buffer.append(line)
+                size += len(line)
+                if size >= self._buffer_size:
+                    click.echo(line[:0].join(buffer), nl=False)
+                    buffer = []
+                    size = 0
+            if buffer:
+                click.echo(buffer[0][:0].join(buffer), nl=False)
+        if callable(self._write_fn):
+            self._write_fn(path, input_string, styled_string)
+
+
+class StagePatcher(object):
+    """Collect styled versions of staged files and add them to the git staging area in a batch.
+
+    Instances are used as the write function for style_file, apply() must be called to update the staging area.
+    """
+
+    def __init__(self):
+        """Constructor."""
+        self._lock = threading.Lock()
+        self._added = []
+        self._patches = []
+
+    def __call__(self, path, input_string, styled_string):
+        """Record the change from input_string to styled_string for a staged file.
+
+        Args:
+            path: the path of the file being patched.
+            input_string (bytes): the current state of the file in the git stage.
+            styled_string (bytes): the properly styled contents to stage.
+        """
+        # If the input was the same as the current file contents, apply the styling locally and add it.
+        if read_file(path) == input_string:
+            write_file(path, '', styled_string)
+            with self._lock:
+                self._added.append(path)
+        else:
+            # The file is partially staged. We must apply a patch to the staging area.
+            if not input_string.endswith(b'\n'):
+                # This is to address a bizarre issue with git apply whereby if the staged file doesn't end in a newline,
+                # the patch will fail to apply.
+                raise click.ClickException('File "{}" must have a trailing newline'.format(path))
+            patch_string = b''.join(unified_diff(path, input_string, styled_string))
+            with self._lock:
+                self._patches.append(patch_string)
+
+    def apply(self):
+        """Update the staging area with all of the recorded changes using one git call for each kind of change."""
+        with self._lock:
+            added, self._added = self._added, []
+            patches, self._patches = self._patches, []
+        if added:
+            zazu.util.check_popen(args=['git', 'update-index', '--add', '-z', '--stdin'], stdin_str='\0'.join(added).encode('utf-8'))
+        if patches:
+            zazu.util.check_popen(args=['git', 'apply', '--cached', '--verbose', '-'], stdin_str=b''.join(patches))
+
+
+def style_file(styler, path, read_fn, write_fn, cache=None, use_stat=False, lines=None):
     """Style a file.
 
     Args:
@@ -70,61 +148,280 @@ def style_file(styler, path, read_fn, write_fn):
         path: the file path.
         read_fn: function used to read in the file contents.
         write_fn: function used to write out the styled file, or None
+        cache: StyleCache used to skip contents that are known to be clean, or None
+        use_stat: skip the file without reading it if the cache has a clean verdict for its stat, read_fn must read the
+            working tree file.
+        lines: the (first, last) line ranges to style, or None to style the whole file. Only clean whole files are
+            added to the cache.
     """
+    stat = os.stat(path) if use_stat and cache is not None else None
+    if stat is not None and cache.is_clean_stat(styler, path, stat):
+        return path, False
     input_string = read_fn(path)
-    styled_string = styler.style_string(input_string)
+    if cache is not None and cache.is_clean(styler, input_string, path):
+        if stat is not None:
+            cache.mark_clean(styler, input_string, path, stat=stat)
+        return path, False
+    styled_string = styler.style_string(input_string) if lines is None else styler.style_lines(input_string, lines)
     violation = styled_string != input_string
     if violation and callable(write_fn):
         write_fn(path, input_string, styled_string)
+    elif not violation and cache is not None and lines is None:
+        cache.mark_clean(styler, input_string, path, stat=stat)
     return path, violation
 
 
-@click.command()
+def style_files(styler, paths, fix, cache=None):
+    """Style a batch of working tree files with as few styler invocations as possible.
+
+    Args:
+        styler: the styler to use to style the files.
+        paths: the file paths.
+        fix: rewrite files with violations if True.
+        cache: StyleCache used to skip contents that are known to be clean, or None
+
+    Returns:
+        list of (str, bool): each path and whether it had a style violation.
+
+    """
+    results = []
+    digests = {}
+    stats = {}
+    if cache is not None:
+        unknown = []
+        for path in paths:
+            stats[path] = os.stat(path)
+            if cache.is_clean_stat(styler, path, stats[path]):
+                results.append((path, False))
+                continue
+            digest = zazu.style_cache.file_hash(path)
+            if cache.is_clean(styler, None, path, digest):
+                cache.mark_clean(styler, None, path, digest, stats[path])
+                results.append((path, False))
+            else:
+                digests[path] = digest
+                unknown.append(path)
+        paths = unknown
+    if not paths:
+        return results
+    for path, violation in styler.style_files(paths, fix):
+        if not violation and cache is not None:
+            cache.mark_clean(styler, None, path, digests[path], stats[path])
+        results.append((path, violation))
+    return results
+
+
+def watch_files(stylers, root, check, diff, cache, jobs, worker_pool, tags, violations):
+    """Style or check the files matching the Stylers as they are saved, until interrupted.
+
+    The style cache is saved after each change, so its stat index holds the verdicts for the files that were clean and
+    later runs only need to examine the files that still have violations.
+
+    Args:
+        stylers (list of Styler): the stylers to run.
+        root (str): the root of the working tree, which must be the current directory.
+        check (bool): only report violations rather than fixing them.
+        diff (bool): print a diff of the changes needed to fix each file.
+        cache (StyleCache): the style cache or None.
+        jobs (int): the number of files to style in parallel.
+        worker_pool (bool): send files to persistent styler workers where the styler supports it.
+        tags (list of str): the tags printed for files with and without violations.
+        violations (set): (styler type, path) of each file with a violation, it is kept up to date.
+    """
+    write_fn = None if check else write_file
+    if diff:
+        write_fn = DiffPrinter(write_fn)
+    watcher = zazu.watch.TreeWatcher(root, [(s.includes, s.excludes) for s in stylers])
+    click.echo('watching for changes, press Ctrl+C to stop')
+    try:
+        for changes in watcher.changes():
+            for s, (files, removed) in zip(stylers, changes):
+                for f in removed:
+                    violations.discard((s.type(), f))
+                if not files:
+                    continue
+                if worker_pool:
+                    s.start_workers(jobs)
+                work = (functools.partial(style_file, s, f, read_file, write_fn, cache, True) for f in files)
+                for f, violation in zazu.util.dispatch(work, max_workers=jobs):
+                    click.echo(zazu.util.format_checklist_item(not violation, text='({}) {}'.format(s.type(), f),
+                                                               tag_formats=tags))
+                    if violation and check:
+                        violations.add((s.type(), f))
+                    else:
+                        violations.discard((s.type(), f))
+            if cache is not None:
+                cache.save()
+            if check:
+                click.echo('{} files with violations'.format(len(violations)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+        for s in stylers:
+            s.stop_workers()
+
+
+def chunks(items, size):
+    """Split a list into lists of at most size items."""
+    return [items[i:i + size] for i in range(0, len(items), size)]
+
+
+@click.command(short_help='Style repo files or check that they are valid style.')
 @click.pass_context
 @click.option('-v', '--verbose', is_flag=True, help='print files that are dirty')
 @click.option('--check', is_flag=True, help='only check the repo for style violations, do not correct them')
 @click.option('--cached', is_flag=True, help='only examine/fix files that are staged for CI commit')
-def style(ctx, verbose, check, cached):
-    """Style repo files or check that they are valid style."""
+@click.option('--diff', is_flag=True, help='print a unified diff of the changes needed to fix each file')
+@click.option('--fail-fast', is_flag=True, help='with --check, stop as soon as the first violation is found')
+@click.option('--no-cache', is_flag=True, help='restyle every file, ignoring results cached by previous runs')
+@click.option('--worker-pool/--no-worker-pool', default=None,
+              help='send files to persistent styler worker processes where the styler supports it, defaults to the style '
+                   '"workerPool" setting or true')
+@click.option('-j', '--jobs', type=click.IntRange(1),
+              help='number of files to style in parallel, defaults to the style "jobs" setting or the number of available CPUs')
+@click.option('--tracked', is_flag=True, help='only examine/fix files tracked by git instead of scanning the directory tree')
+@click.option('--since', metavar='REF',
+              help='only examine/fix files changed since HEAD diverged from REF, defaults to the style "since" setting')
+@click.option('--all', 'all_files', is_flag=True, help='examine/fix every file, overriding --since and the "since" setting')
+@click.option('--changed-lines/--all-lines', default=None,
+              help='with --cached, only style the staged lines that differ from HEAD where the styler supports line ranges, '
+                   'defaults to the style "changedLines" setting or false')
+@click.option('--watch', is_flag=True, help='after examining the files, keep examining/fixing files in the tree as they are saved')
+@click.argument('pathspec', nargs=-1)
+def style(ctx, verbose, check, cached, diff, fail_fast, no_cache, worker_pool, jobs, tracked, since, all_files, changed_lines, watch,
+          pathspec):
+    """Style repo files or check that they are valid style.
+
+    If PATHSPEC is given only tracked files matching it are examined. The "since" setting isn't applied to --cached runs,
+    which already examine only the staged files. With --watch every file the stylers include is watched, whatever files
+    were examined first.
+    """
+    if watch and cached:
+        raise click.UsageError('--watch examines the working tree and can\'t be used with --cached')
     ctx.obj.check_repo()
+    style_config = ctx.obj.style_config()
+    if all_files:
+        since = None
+    elif since is None and not cached:
+        since = style_config.get('since')
+    if worker_pool is None:
+        worker_pool = style_config.get('workerPool', True)
+    if changed_lines is None:
+        changed_lines = style_config.get('changedLines', False)
+    if jobs is None:
+        jobs = style_config.get('jobs', None)
+        if jobs is not None and (not isinstance(jobs, int) or isinstance(jobs, bool) or jobs < 1):
+            raise click.ClickException('style "jobs" setting must be a positive integer, got "{}"'.format(jobs))
+        jobs = jobs or zazu.util.cpu_count()
+    # Pathspecs are relative to the current directory but git is run from the repo root. Leave pathspec magic alone.
+    pathspec = [p if p.startswith(':') else os.path.relpath(os.path.abspath(p), ctx.obj.repo_root) for p in pathspec]
     file_count = 0
     violation_count = 0
+    violations = set()
     stylers = ctx.obj.stylers()
     FIXED_OK = [click.style('FIXED', fg='red', bold=True), click.style(' OK  ', fg='green', bold=True)]
     tags = zazu.util.FAIL_OK if check else FIXED_OK
     with zazu.util.cd(ctx.obj.repo_root):
         if stylers:
+            staged_lines = {}
             if cached:
                 staged_files = zazu.git_helper.get_touched_files(ctx.obj.repo)
+                stage_patcher = StagePatcher()
+                if changed_lines:
+                    staged_lines = zazu.git_helper.get_staged_line_ranges(ctx.obj.repo_root)
+            # Walk the tree once, classifying each file for all of the stylers.
+            patterns = [(styler.includes, styler.excludes) for styler in stylers]
+            if since:
+                # Files may have been deleted from the working tree after being committed.
+                try:
+                    changed_files = zazu.git_helper.get_changed_files(ctx.obj.repo, since, pathspec)
+                except git.exc.GitCommandError:
+                    raise click.ClickException('unable to find the changes since "{}", check that the ref exists and has been '
+                                               'fetched or use --all to examine every file'.format(since))
+                changed_files = [f for f in changed_files if os.path.isfile(f)]
+                styler_files = zazu.util.classify_files(changed_files, patterns, exclude_hidden=True)
+            elif tracked or pathspec:
+                tracked_files = zazu.git_helper.get_tracked_files(ctx.obj.repo_root, pathspec)
+                styler_files = zazu.util.classify_files(tracked_files, patterns, exclude_hidden=True)
+            else:
+                styler_files = zazu.util.classify_tree(ctx.obj.repo_root, patterns, exclude_hidden=True)
+            # Only a run that examines every file can tell which cached entries are stale.
+            complete = not (cached or since or pathspec)
+            cache = None
+            if not no_cache:
+                cache = zazu.style_cache.StyleCache(zazu.style_cache.default_path(ctx.obj.repo))
             # Run each Styler
-            for s in stylers:
-                files = zazu.util.scantree(ctx.obj.repo_root,
-                                           s.includes,
-                                           s.excludes,
-                                           exclude_hidden=True)
-                if cached:
-                    files = set(files).intersection(staged_files)
-                    read_fn = zazu.git_helper.read_staged
-                    write_fn = stage_patch
-                else:
-                    read_fn = read_file
-                    write_fn = write_file
-                if check:
-                    write_fn = None
-                file_count += len(files)
-                work = [functools.partial(style_file, s, f, read_fn, write_fn) for f in files]
-                checked_files = zazu.util.dispatch(work)
-                for f, violation in checked_files:
-                    if verbose:
-                        click.echo(zazu.util.format_checklist_item(not violation,
-                                                                   text='({}) {}'.format(s.type(), f),
-                                                                   tag_formats=tags))
-                    violation_count += violation
+            staged_reader = zazu.git_helper.StagedFileReader(ctx.obj.repo_root) if cached else None
+            try:
+                for s, files in zip(stylers, styler_files):
+                    if cached:
+                        files = set(files).intersection(staged_files)
+                        read_fn = staged_reader.read
+                        write_fn = stage_patcher
+                    else:
+                        read_fn = read_file
+                        write_fn = write_file
+                    if check:
+                        write_fn = None
+                    if diff:
+                        write_fn = DiffPrinter(write_fn)
+                    if worker_pool and files:
+                        s.start_workers(jobs)
+                    if cache is not None:
+                        # Probe the tool version once up front rather than racing to do so in every worker, the workers
+                        # may run a different version of the tool than the one that would be launched without them.
+                        s.fingerprint()
+                    # Styling files in batches doesn't return the styled contents needed to print diffs.
+                    batched = not cached and not diff and s.batch_size > 1
+                    if batched:
+                        work = (functools.partial(style_files, s, c, not check, cache) for c in chunks(list(files), s.batch_size))
+                    else:
+                        work = (functools.partial(style_file, s, f, read_fn, write_fn, cache, not cached, staged_lines.get(f))
+                                for f in files)
+                    results = zazu.util.dispatch(work, max_workers=jobs)
+                    try:
+                        with zazu.profiler.span('style {}'.format(s.type()), 'style', files=len(files)):
+                            checked_files = itertools.chain.from_iterable(results) if batched else results
+                            for f, violation in checked_files:
+                                if verbose:
+                                    click.echo(zazu.util.format_checklist_item(not violation,
+                                                                               text='({}) {}'.format(s.type(), f),
+                                                                               tag_formats=tags))
+                                file_count += 1
+                                violation_count += violation
+                                if violation and check:
+                                    violations.add((s.type(), f))
+                                if violation and check and fail_fast:
+                                    # Stop the styler processes that are running, the queued work is dropped on close.
+                                    zazu.util.kill_running_processes()
+                                    s.stop_workers(cancel=True)
+                                    break
+                    finally:
+                        results.close()
+                        if not ctx.obj.keep_workers:
+                            s.stop_workers()
+                        zazu.util.resume_processes()
+                    if violation_count and check and fail_fast:
+                        complete = False
+                        break
+                    if cached and not check:
+                        # Stage this styler's fixes before the next styler reads the staged files.
+                        stage_patcher.apply()
+                        staged_reader.refresh()
+            finally:
+                if staged_reader is not None:
+                    staged_reader.close()
+            if cache is not None:
+                cache.save(prune=complete)
             if verbose:
                 if check:
                     click.echo('{} files with violations in {} files'.format(violation_count, file_count))
                 else:
                     click.echo('{} files fixed in {} files'.format(violation_count, file_count))
+            if watch:
+                watch_files(stylers, ctx.obj.repo_root, check, diff, cache, jobs, worker_pool, tags, violations)
+                violation_count = len(violations)
             ctx.exit(-1 if check and violation_count else 0)
         else:
             click.echo('no style settings found')
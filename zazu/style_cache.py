@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+"""Persistent cache of style results for zazu."""
+import zazu.util
+zazu.util.lazy_import(locals(), [
+    'collections',
+    'functools',
+    'hashlib',
+    'json',
+    'mmap',
+    'os',
+    'threading'
+])
+
+__author__ = "Nicholas Wiles"
+__copyright__ = "Copyright 2017"
+
+
+def default_path(repo):
+    """Return the default location of the style cache for a git repo."""
+    return os.path.join(repo.git_dir, 'zazu', 'style_cache.json')
+
+
+def blob_hash(string):
+    """Return the git blob hash of a string."""
+    if isinstance(string, type(u'')):
+        string = string.encode('utf-8')
+    sha = hashlib.sha1('blob {}\0'.format(len(string)).encode('utf-8'))
+    sha.update(string)
+    return sha.hexdigest()
+
+
+def file_hash(path, mmap_size=1 << 20):
+    """Return the git blob hash of a file's contents.
+
+    Args:
+        path (str): the file to hash.
+        mmap_size (int): files at least this large are hashed through a memory map rather than read into memory.
+    """
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < mmap_size or not size:
+            return blob_hash(f.read())
+        contents = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return blob_hash(contents)
+        finally:
+            contents.close()
+
+
+def stat_key(stat):
+    """Return the (mtime in ns, size, inode) of an os.stat result, used to tell whether a file may have changed."""
+    mtime_ns = getattr(stat, 'st_mtime_ns', None)
+    if mtime_ns is None:
+        mtime_ns = int(stat.st_mtime * 1e9)
+    return [mtime_ns, stat.st_size, stat.st_ino]
+
+
+class StyleCache(object):
+    """Remember contents that have already been checked and found to be clean by a Styler.
+
+    Entries are keyed on the content's blob hash and the Styler fingerprint for the file, so changing the styler options,
+    the tool's configuration files or upgrading the style tool invalidates the cached results. Stale entries are dropped
+    by saving with prune=True after a run that examined every file, otherwise the oldest entries beyond max_entries are.
+
+    Working tree files that were clean are also indexed by path and stat_key(), so they can be skipped without being
+    read. Like git's index, a stat entry whose mtime isn't older than the cache file is "racily clean": the file may
+    have changed within the same timestamp tick after it was read, so it is ignored and the file is read again.
+    """
+
+    def __init__(self, path, max_entries=50000):
+        """Constructor, loads the cache from path if it exists.
+
+        Args:
+            path (str): the file where the cache is persisted.
+            max_entries (int): the number of entries of each kind kept for each styler type.
+        """
+        self._path = path
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._stats = {}
+        self._seen = {}
+        self._seen_stats = {}
+        self._racy_mtime = 0
+        self._modified = False
+        self.load()
+
+    def load(self):
+        """Load the cache from disk, an unreadable cache is treated as empty."""
+        try:
+            with open(self._path, 'r') as f:
+                data = json.load(f)
+                self._racy_mtime = stat_key(os.fstat(f.fileno()))[0]
+            # Entries are stored oldest first.
+            self._entries = {k: collections.OrderedDict((key, None) for key in v) for k, v in data['clean'].items()}
+            self._stats = {k: collections.OrderedDict(v) for k, v in data['stat'].items()}
+        except (IOError, OSError, ValueError, KeyError, TypeError, AttributeError):
+            self._entries = {}
+            self._stats = {}
+            self._racy_mtime = 0
+        self._seen = {}
+        self._seen_stats = {}
+        self._modified = False
+
+    @staticmethod
+    def _prune(entries, seen):
+        return {k: collections.OrderedDict((key, value) for key, value in v.items() if key in seen.get(k, ()))
+                for k, v in entries.items()}
+
+    def save(self, prune=False):
+        """Write the cache to disk if it has been modified.
+
+        Args:
+            prune (bool): drop every entry that wasn't looked up or added since the cache was loaded.
+        """
+        with self._lock:
+            if prune:
+                entries = self._prune(self._entries, self._seen)
+                stats = self._prune(self._stats, self._seen_stats)
+                self._modified |= any(len(v) != len(entries[k]) for k, v in self._entries.items())
+                self._modified |= any(len(v) != len(stats[k]) for k, v in self._stats.items())
+                self._entries = {k: v for k, v in entries.items() if v}
+                self._stats = {k: v for k, v in stats.items() if v}
+            for entries in list(self._entries.values()) + list(self._stats.values()):
+                while len(entries) > self._max_entries:
+                    entries.popitem(last=False)
+                    self._modified = True
+            if not self._modified:
+                return
+            data = {'clean': {k: list(v) for k, v in self._entries.items()},
+                    'stat': {k: list(v.items()) for k, v in self._stats.items()}}
+            self._modified = False
+        zazu.util.atomic_write(self._path, functools.partial(json.dump, data))
+
+    @staticmethod
+    def _key(fingerprint, string, digest):
+        key = '{}:{}'.format(fingerprint, digest or blob_hash(string))
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def is_clean(self, styler, string, path=None, digest=None):
+        """Return True if string is known to be clean for the styler.
+
+        Args:
+            styler: the Styler.
+            string: the contents to look up.
+            path: the file the contents belong to, selects the tool configuration files that apply.
+            digest: the blob_hash of the contents if it is already known, string is ignored if it is given.
+        """
+        key = self._key(styler.fingerprint(path), string, digest)
+        with self._lock:
+            return self._touch(styler.type(), key)
+
+    def _touch(self, type, key):
+        entries = self._entries.get(type)
+        if entries is None or key not in entries:
+            return False
+        # Move the entry to the newest position.
+        del entries[key]
+        entries[key] = None
+        self._seen.setdefault(type, set()).add(key)
+        return True
+
+    def is_clean_stat(self, styler, path, stat):
+        """Return True if a working tree file is known to be clean from its os.stat result alone.
+
+        Args:
+            styler: the Styler.
+            path (str): the file path.
+            stat: the os.stat result of the file.
+        """
+        fingerprint = styler.fingerprint(path)
+        with self._lock:
+            entry = self._stats.get(styler.type(), {}).get(path)
+            if entry is None or entry[:3] != stat_key(stat) or entry[0] >= self._racy_mtime or entry[3] != fingerprint:
+                return False
+            self._seen_stats.setdefault(styler.type(), set()).add(path)
+            # Keep the content entry alive as well, it is used if only the file's timestamp changes.
+            self._touch(styler.type(), entry[4])
+            return True
+
+    def mark_clean(self, styler, string, path=None, digest=None, stat=None):
+        """Record that string is clean for the styler, see is_clean().
+
+        Args:
+            stat: the os.stat result of the file at path, taken before it was read. If given, later runs may skip the file
+                based on is_clean_stat().
+        """
+        fingerprint = styler.fingerprint(path)
+        key = self._key(fingerprint, string, digest)
+        with self._lock:
+            type = styler.type()
+            entries = self._entries.setdefault(type, collections.OrderedDict())
+            self._seen.setdefault(type, set()).add(key)
+            if key not in entries:
+                entries[key] = None
+                self._modified = True
+            if stat is not None:
+                entry = stat_key(stat) + [fingerprint, key]
+                stats = self._stats.setdefault(type, collections.OrderedDict())
+                self._seen_stats.setdefault(type, set()).add(path)
+                # Rewrite racily clean entries, the cache file's new mtime makes them usable.
+                if stats.get(path) != entry or entry[0] >= self._racy_mtime:
+                    stats.pop(path, None)
+                    stats[path] = entry
+                    self._modified = True
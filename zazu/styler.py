@@ -1,18 +1,130 @@
 # -*- coding: utf-8 -*-
 """Styler class for zazu."""
+import zazu.style_cache
 import zazu.util
 zazu.util.lazy_import(locals(), [
     'functools',
-    'os'
+    'hashlib',
+    'json',
+    'os',
+    'subprocess'
 ])
 
 __author__ = "Nicholas Wiles"
 __copyright__ = "Copyright 2016"
 
 
+def read_files(paths):
+    """Read a list of files and return their contents as bytes."""
+    contents = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            contents.append(f.read())
+    return contents
+
+
+def parent_dirs(path):
+    """Return the absolute path of a directory followed by each of its parents up to the filesystem root."""
+    path = os.path.abspath(path)
+    dirs = [path]
+    while os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+        dirs.append(path)
+    return dirs
+
+
+def option_value(options, names):
+    """Return the value given to a command line option in either the "name=value" or "name value" form, or None."""
+    for i, option in enumerate(options):
+        for name in names:
+            if option.startswith(name + '='):
+                return option[len(name) + 1:]
+            if option == name and i + 1 < len(options):
+                return options[i + 1]
+    return None
+
+
+def fix_in_place(args, paths):
+    """Run a style tool that rewrites files in place and report which files it changed.
+
+    Args:
+        args (list of str): the tool command line, the paths are appended to it.
+        paths (list of str): the files to fix.
+
+    Returns:
+        list of (str, bool): each path and whether the tool changed it.
+
+    """
+    before = read_files(paths)
+    zazu.util.check_popen(args=args + paths)
+    return [(p, a != b) for p, a, b in zip(paths, read_files(paths), before)]
+
+
+def find_executable(name):
+    """Return the real path of an executable found on the PATH, or None if there isn't one."""
+    try:
+        from shutil import which
+    except ImportError:
+        from distutils.spawn import find_executable as which
+    path = which(name)
+    return os.path.realpath(path) if path else None
+
+
+def version_cache_path():
+    """Return the location of the cache of tool versions, it is shared by every repo."""
+    return os.path.join(os.path.expanduser('~'), '.zazu', 'tool_versions.json')
+
+
+def probe_version(args, cache_path=None):
+    """Run a tool to print its version, reusing the output saved by an earlier run of the same binary.
+
+    The saved output is keyed on the command line and on the path, mtime, size and inode of the binary found on the PATH,
+    so installing another version of the tool runs the probe again.
+
+    Args:
+        args (list of str): the command line that prints the version, e.g. ['clang-format', '--version'].
+        cache_path (str): the cache file, defaults to version_cache_path().
+
+    Returns:
+        str: the output of the command, stripped.
+    """
+    binary = find_executable(args[0])
+    if binary is None:
+        # Let running it report that the tool isn't installed.
+        return zazu.util.check_output(args, stderr=subprocess.STDOUT).decode('utf-8').strip()
+    cache_path = cache_path or version_cache_path()
+    name = ' '.join(args)
+    key = [binary] + zazu.style_cache.stat_key(os.stat(binary))
+    try:
+        with open(cache_path, 'r') as f:
+            versions = json.load(f)
+        if versions[name][0] == key:
+            return versions[name][1]
+    except (IOError, OSError, ValueError, KeyError, TypeError, IndexError):
+        pass
+    version = zazu.util.check_output(args, stderr=subprocess.STDOUT).decode('utf-8').strip()
+    try:
+        with open(cache_path, 'r') as f:
+            versions = json.load(f)
+        if not isinstance(versions, dict):
+            versions = {}
+    except (IOError, OSError, ValueError):
+        versions = {}
+    versions[name] = [key, version]
+    try:
+        zazu.util.atomic_write(cache_path, functools.partial(json.dump, versions))
+    except (IOError, OSError):
+        # The version is still right, it will just be probed again next time.
+        pass
+    return version
+
+
 class Styler(object):
     """Parent of all style plugins."""
 
+    # The maximum number of files passed to a single style_files() call.
+    batch_size = 1
+
     def __init__(self, options=[], excludes=[], includes=[]):
         """Constructor.
 
@@ -24,15 +136,17 @@ class Styler(object):
         self.options = options
         self.excludes = excludes
         self.includes = includes
+        self._fingerprint = None
+        self._config_digests = {}
 
     def style_string(self, string):
-        """Style a string and return a diff of requested changes.
+        """Style the contents of a file.
 
         Args:
-            string: the string to style
+            string (bytes): the file contents to style.
 
         Returns:
-                A unified diff of requested changes or an empty string if no changes are requested.
+            bytes: the styled contents, equal to string if no changes are requested.
 
         Raises:
             NotImplementedError
@@ -40,6 +154,119 @@ class Styler(object):
         """
         raise NotImplementedError('All style plugins must implement style_string')
 
+    def style_lines(self, string, lines):
+        """Style some of the lines of the contents of a file.
+
+        Stylers whose tool can be limited to ranges of lines should override this, by default all of the contents are
+        styled.
+
+        Args:
+            string (bytes): the file contents to style.
+            lines (list of tuple): the (first, last) 1-based line ranges to style, in order.
+
+        Returns:
+            bytes: the styled contents, equal to string if no changes are requested.
+
+        """
+        return self.style_string(string)
+
+    def style_files(self, paths, fix=False):
+        """Check or fix the style of files in the working tree.
+
+        Stylers whose tool accepts many files per invocation should override this to style all of the paths at once.
+
+        Args:
+            paths (list of str): the files to style.
+            fix (bool): rewrite files with violations if True.
+
+        Returns:
+            list of (str, bool): each path and whether it had a style violation.
+
+        """
+        results = []
+        for path, string in zip(paths, read_files(paths)):
+            styled_string = self.style_string(string)
+            violation = styled_string != string
+            if violation and fix:
+                with open(path, 'wb') as f:
+                    f.write(styled_string)
+            results.append((path, violation))
+        return results
+
+    def start_workers(self, count):
+        """Start persistent worker processes that subsequent style_string calls are sent to.
+
+        Stylers whose tool must be restarted for every input keep spawning a process per call, so this is a no-op for
+        them.
+
+        Args:
+            count (int): the number of worker processes to start.
+        """
+        pass
+
+    def stop_workers(self, cancel=False):
+        """Shut down any workers started by start_workers.
+
+        Args:
+            cancel (bool): kill the workers rather than waiting for calls that are in progress to finish.
+        """
+        pass
+
+    def version(self):
+        """Return the version string of the underlying style tool, or an empty string if it is unknown.
+
+        Stylers that run an external tool should use probe_version so the tool is only run once per installed version.
+        """
+        return ''
+
+    def config_files(self, path):
+        """Return the configuration files the style tool reads when styling a file.
+
+        Their contents are part of the fingerprint. Stylers whose tool reads configuration files should override this, the
+        set of files may be looked up once for the lifetime of the styler. It must include the files the tool would read
+        if they existed, so creating one while the styler is kept, as the daemon does, changes the fingerprint.
+
+        Args:
+            path (str): the file being styled, or None when the contents aren't associated with a file.
+
+        Returns:
+            list of str: absolute paths of the configuration files, they need not exist.
+
+        """
+        return []
+
+    def _config_digest(self, path):
+        """Return a hash of a configuration file's contents, or an empty string if it doesn't exist."""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return ''
+        key = (stat.st_mtime, stat.st_size, stat.st_ino)
+        digest = self._config_digests.get(path)
+        if digest is None or digest[0] != key:
+            with open(path, 'rb') as f:
+                digest = (key, hashlib.sha1(f.read()).hexdigest())
+            self._config_digests[path] = digest
+        return digest[1]
+
+    def fingerprint(self, path=None):
+        """Return a hash identifying the styler type, its options, the tool version and its configuration files.
+
+        Two stylers with the same fingerprint produce the same output for the same input, so the fingerprint may be used
+        to key cached style results.
+
+        Args:
+            path (str): the file being styled, selects the configuration files that apply to it.
+        """
+        if self._fingerprint is None:
+            key = json.dumps([self.type(), self.options, self.version()])
+            self._fingerprint = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        configs = self.config_files(path)
+        if not configs:
+            return self._fingerprint
+        key = json.dumps([self._fingerprint] + [[c, self._config_digest(c)] for c in configs])
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
     @classmethod
     def from_config(cls, config, excludes, includes):
         """Create a Styler based on a configuration dictionary.
@@ -56,4 +283,5 @@ class Styler(object):
         obj = cls(config.get('options', []),
                   excludes + config.get('excludes', []),
                   includes + config.get('includes', []))
+        obj.batch_size = config.get('batchSize', cls.batch_size)
         return obj
@@ -10,7 +10,7 @@ __author__ = "Nicholas Wiles"
 __copyright__ = "Copyright 2016"
 
 
-@click.command()
+@click.command(short_help='Upgrade Zazu using pip.')
 @click.pass_context
 @click.option('--version', default='', help='version spec to upgrade to or empty to use the version specified in the zazu.yaml file')
 def upgrade(ctx, version):
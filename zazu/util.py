@@ -1,11 +1,6 @@
 # -*- coding: utf-8 -*-
 """Utility functions for zazu."""
-
-try:
-    import readline  # NOQA
-except ImportError:
-    # This will be available on Windows
-    import pyreadline  # NOQA
+import zazu.profiler
 
 
 def lazy_import(scope, imports):
@@ -40,8 +35,10 @@ lazy_import(locals(), [
     'contextlib',
     'fnmatch',
     'inquirer',
+    'math',
     'multiprocessing',
     'os',
+    're',
     'subprocess'
 ])
 __author__ = "Nicholas Wiles"
@@ -51,7 +48,8 @@ __copyright__ = "Copyright 2016"
 def check_output(*args, **kwargs):
     """Like subprocess.check_output but raises an exception if the program cannot be found."""
     try:
-        return subprocess.check_output(*args, **kwargs)
+        with zazu.profiler.subprocess_span(kwargs.get('args', args[0] if args else None)):
+            return subprocess.check_output(*args, **kwargs)
     except OSError:
         raise_uninstalled(args[0][0])
 
@@ -59,17 +57,25 @@ def check_output(*args, **kwargs):
 def call(*args, **kwargs):
     """Like subprocess.call but raise an exception if the program cannot be found."""
     try:
-        return subprocess.call(*args, **kwargs)
+        with zazu.profiler.subprocess_span(kwargs.get('args', args[0] if args else None)):
+            return subprocess.call(*args, **kwargs)
     except OSError:
         raise_uninstalled(args[0][0])
 
 
-def check_popen(args, stdin_str='', *other_args, **kwargs):
+# Processes started by check_popen that haven't finished yet. Adding to, removing from and copying a set are atomic
+# under the GIL so no lock is needed.
+_running_processes = set()
+# Set by kill_running_processes to kill any process that check_popen starts until resume_processes is called.
+_processes_stopped = [False]
+
+
+def check_popen(args, stdin_str=b'', *other_args, **kwargs):
     """Like subprocess.Popen but raises an exception if the program cannot be found.
 
     Args:
         args: passed to Popen.
-        stdinput_str: a string that will be sent to std input via communicate().
+        stdin_str: bytes that will be sent to std input via communicate().
         other_args: other arguments passed to Popen.
         kwargs: other kwargs passed to Popen.
     Raises:
@@ -78,10 +84,17 @@ def check_popen(args, stdin_str='', *other_args, **kwargs):
 
     """
     try:
-        p = subprocess.Popen(args=args, stdin=subprocess.PIPE,
-                             stdout=subprocess.PIPE, stderr=subprocess.PIPE,
-                             *other_args, **kwargs)
-        stdout, stderr = p.communicate(stdin_str)
+        with zazu.profiler.subprocess_span(args):
+            p = subprocess.Popen(args=args, stdin=subprocess.PIPE,
+                                 stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                 *other_args, **kwargs)
+            _running_processes.add(p)
+            try:
+                if _processes_stopped[0]:
+                    p.kill()
+                stdout, stderr = p.communicate(stdin_str)
+            finally:
+                _running_processes.discard(p)
     except OSError:
         raise_uninstalled(args[0][0])
     if p.returncode:
@@ -89,6 +102,25 @@ def check_popen(args, stdin_str='', *other_args, **kwargs):
     return stdout
 
 
+def kill_running_processes():
+    """Kill all processes running in check_popen, their callers will get a CalledProcessError.
+
+    Processes that check_popen starts afterwards are killed as well, until resume_processes() is called.
+    """
+    _processes_stopped[0] = True
+    for p in list(_running_processes):
+        try:
+            p.kill()
+        except OSError:
+            # The process already exited.
+            pass
+
+
+def resume_processes():
+    """Allow check_popen to run processes again after kill_running_processes()."""
+    _processes_stopped[0] = False
+
+
 @contextlib.contextmanager
 def cd(path):
     """Change directory context manager.
@@ -105,20 +137,108 @@ def cd(path):
         os.chdir(prev_dir)
 
 
-def dispatch(work):
-    """Dispatch a list of callables in multiple threads and yields their returns.
+def atomic_write(path, write_fn, mode='w'):
+    """Write a file by writing a temporary file next to it and renaming it over the file.
+
+    Readers see either the old or the new contents, never a partly written file. The directory is created if needed.
+
+    Args:
+        path (str): the file to write.
+        write_fn: called with the open temporary file to write the contents.
+        mode (str): the mode the temporary file is opened with, 'w' or 'wb'.
+
+    Raises:
+        IOError, OSError: if the file can't be written.
+
+    """
+    try:
+        os.makedirs(os.path.dirname(path))
+    except OSError:
+        pass
+    temp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(temp_path, mode) as f:
+        write_fn(f)
+    try:
+        os.rename(temp_path, path)
+    except OSError:
+        # Windows won't rename over an existing file.
+        os.remove(path)
+        os.rename(temp_path, path)
+
+
+def cpu_count():
+    """Return the number of CPUs available to this process.
+
+    Unlike multiprocessing.cpu_count() this honors the CPU affinity mask and cgroup CPU quotas, so containerized CI agents
+    aren't oversubscribed.
+    """
+    try:
+        count = len(os.sched_getaffinity(0))
+    except AttributeError:
+        count = multiprocessing.cpu_count()
+    quota = cgroup_cpu_quota()
+    if quota is not None:
+        count = min(count, max(1, int(math.ceil(quota))))
+    return count
+
+
+def cgroup_cpu_quota():
+    """Return the cgroup CPU quota in CPUs, or None if there isn't one."""
+    try:
+        # cgroup v2
+        with open('/sys/fs/cgroup/cpu.max', 'r') as f:
+            quota, period = f.read().split()[:2]
+        return None if quota == 'max' else float(quota) / float(period)
+    except (IOError, OSError, ValueError):
+        pass
+    try:
+        # cgroup v1
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_quota_us', 'r') as f:
+            quota = int(f.read())
+        with open('/sys/fs/cgroup/cpu/cpu.cfs_period_us', 'r') as f:
+            period = int(f.read())
+        return float(quota) / period if quota > 0 and period > 0 else None
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def dispatch(work, max_workers=None, max_in_flight=None, use_processes=False):
+    """Dispatch callables to a pool of workers and yield their returns as they finish.
+
+    At most max_in_flight callables are submitted at a time and more are only pulled from work as results are consumed,
+    so memory use doesn't depend on how much work there is.
 
     Args:
-        work: the list of callables to execute.
+        work: an iterable of callables to execute, it is consumed lazily.
+        max_workers (int): the number of workers, defaults to cpu_count().
+        max_in_flight (int): the maximum number of callables that are submitted but not yet yielded, defaults to twice
+            the number of workers.
+        use_processes (bool): run the callables in worker processes rather than threads, they must be picklable.
 
     Yields:
         the results of the callables as they are finished.
 
     """
-    with concurrent.futures.ThreadPoolExecutor(max_workers=multiprocessing.cpu_count()) as executor:
-        futures = {executor.submit(w): w for w in work}
-        for future in concurrent.futures.as_completed(futures):
-            yield future.result()
+    max_workers = max_workers or cpu_count()
+    max_in_flight = max(max_in_flight or 2 * max_workers, 1)
+    executor_type = concurrent.futures.ProcessPoolExecutor if use_processes else concurrent.futures.ThreadPoolExecutor
+    with executor_type(max_workers=max_workers) as executor:
+        pending = set()
+        try:
+            for w in work:
+                pending.add(executor.submit(w))
+                if len(pending) >= max_in_flight:
+                    done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                    for future in done:
+                        yield future.result()
+            while pending:
+                done, pending = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        finally:
+            # The consumer stopped early or a callable raised, don't start anything that is still queued.
+            for future in pending:
+                future.cancel()
 
 
 FAIL_OK = [click.style('FAIL', fg='red', bold=True), click.style(' OK ', fg='green', bold=True)]
@@ -139,6 +259,18 @@ def format_checklist_item(tag, text, tag_formats=FAIL_OK):
     return '[{}] {}'.format(tag_formats[tag], text)
 
 
+def enable_line_editing():
+    """Give input() line editing and history, which importing readline does as a side effect.
+
+    This is done on the first prompt rather than at startup, since most commands never prompt.
+    """
+    try:
+        import readline  # NOQA
+    except ImportError:
+        # This will be available on Windows
+        import pyreadline  # NOQA
+
+
 def prompt(text, default=None, expected_type=str):
     """Prompt user for an input.
 
@@ -151,6 +283,7 @@ def prompt(text, default=None, expected_type=str):
         user's input casted to expected_type or default if no inout is provided.
 
     """
+    enable_line_editing()
     if default is not None:
         result = builtins.input('{} [{}]: '.format(text, default)) or default
     else:
@@ -183,6 +316,69 @@ def pick(choices, message):
     return choices[0]
 
 
+class PathMatcher(object):
+    """Match relative paths against include and exclude glob patterns.
+
+    The patterns are compiled once into a suffix index and combined regular expressions, so the cost of matching a path
+    doesn't grow with the number of patterns.
+    """
+
+    def __init__(self, include_patterns, exclude_patterns, exclude_hidden=False):
+        """Constructor.
+
+        Args:
+            include_patterns (str): list of glob patterns to include.
+            exclude_patterns (str): list of glob patterns to exclude, these also exclude directories they name.
+            exclude_hidden (bool): don't include hidden files if True.
+        """
+        self._exclude_hidden = exclude_hidden
+        self._exclude_dirs = set([os.path.normcase(os.path.normpath(e)) for e in exclude_patterns])
+        # Simple "*.ext" patterns are by far the most common, they are tested with a single endswith() call.
+        simple = [i for i in include_patterns if i.startswith('*') and not _has_glob(i[1:])]
+        self._include_suffixes = tuple(os.path.normcase(i[1:]) for i in simple)
+        self._include = _compile_globs([i for i in include_patterns if i not in simple])
+        self._exclude = _compile_globs(exclude_patterns)
+        # A directory can be pruned if no include pattern's literal prefix is compatible with it. Patterns that begin
+        # with a wildcard are compatible with every directory.
+        prefixes = [_literal_prefix(i) for i in include_patterns]
+        self._include_prefixes = None if '' in prefixes else prefixes
+
+    def match_file(self, path):
+        """Return True if a relative file path is included and not excluded."""
+        path = os.path.normcase(path)
+        if not (path.endswith(self._include_suffixes) or (self._include is not None and self._include.match(path))):
+            return False
+        return self._exclude is None or not self._exclude.match(path)
+
+    def prune_dir(self, path):
+        """Return True if no file within a relative directory path can match."""
+        path = os.path.normcase(path)
+        if path in self._exclude_dirs or (self._exclude_hidden and path[0] == '.'):
+            return True
+        if self._include_prefixes is not None:
+            path += os.sep
+            return not any(p.startswith(path) or path.startswith(p) for p in self._include_prefixes)
+        return False
+
+
+def _has_glob(pattern):
+    return any(c in pattern for c in '*?[')
+
+
+def _literal_prefix(pattern):
+    """Return the part of a glob pattern before the first wildcard."""
+    match = re.search(r'[*?[]', pattern)
+    return os.path.normcase(pattern[:match.start()] if match else pattern).replace('/', os.sep)
+
+
+def _compile_globs(patterns):
+    """Compile a list of glob patterns into a single regular expression, or None if there are no patterns."""
+    if not patterns:
+        return None
+    regex = '|'.join('(?:{})'.format(fnmatch.translate(os.path.normcase(p))) for p in patterns)
+    return re.compile(regex)
+
+
 def scantree(base_path, include_patterns, exclude_patterns, exclude_hidden=False):
     """List files recursively that match any of the include glob patterns but are not in an excluded pattern.
 
@@ -196,20 +392,97 @@ def scantree(base_path, include_patterns, exclude_patterns, exclude_hidden=False
         list of str: of file paths (relative to the base path) that match the input parameters.
 
     """
-    files = []
-    exclude_dirs = set([os.path.normpath(e) for e in exclude_patterns])
+    return classify_tree(base_path, [(include_patterns, exclude_patterns)], exclude_hidden)[0]
+
+
+@zazu.profiler.profiled('scantree')
+def classify_tree(base_path, patterns, exclude_hidden=False):
+    """Walk a directory tree once and list the files that match each of several sets of patterns.
+
+    Args:
+        base_path (str): the path to scan.
+        patterns (list of tuple): (include_patterns, exclude_patterns) pairs, see scantree.
+        exclude_hidden (bool): don't include hidden files if True.
+
+    Returns:
+        list of list of str: for each pair of patterns, the file paths (relative to the base path) that match it.
+
+    """
+    matchers = [PathMatcher(i, e, exclude_hidden) for i, e in patterns]
+    results = [[] for m in matchers]
+    # The matchers that haven't pruned each directory that is still to be walked.
+    active = {base_path: list(builtins.range(len(matchers)))}
     for dirName, subdirList, fileList in os.walk(base_path):
+        indices = active.pop(dirName)
+        rel_dir = os.path.relpath(dirName, base_path)
+        prefix = '' if rel_dir == os.curdir else rel_dir + os.sep
         for i in builtins.range(len(subdirList) - 1, -1, -1):
-            sub = os.path.relpath(os.path.join(dirName, subdirList[i]), base_path)
-            if sub in exclude_dirs or (exclude_hidden and sub[0] == '.'):
+            sub = prefix + subdirList[i]
+            sub_indices = [m for m in indices if not matchers[m].prune_dir(sub)]
+            if sub_indices:
+                active[os.path.join(dirName, subdirList[i])] = sub_indices
+            else:
                 del subdirList[i]
         for f in fileList:
             if (not exclude_hidden) or (f[0] != '.'):
-                file = os.path.relpath(os.path.join(dirName, f), base_path)
-                if any(fnmatch.fnmatch(file, i) for i in include_patterns):
-                    if all(not fnmatch.fnmatch(file, e) for e in exclude_patterns):
-                        files.append(file)
-    return files
+                file = prefix + f
+                for m in indices:
+                    if matchers[m].match_file(file):
+                        results[m].append(file)
+    return results
+
+
+def filter_files(paths, include_patterns, exclude_patterns, exclude_hidden=False):
+    """Filter a list of relative file paths using the same rules as scantree.
+
+    Args:
+        paths (list of str): file paths relative to the base path, e.g. from "git ls-files".
+        include_patterns (str): list of glob patterns to include.
+        exclude_patterns (str): list of glob patterns to exclude.
+        exclude_hidden (bool): don't include hidden files if True.
+
+    Returns:
+        list of str: of the file paths that match the input parameters.
+
+    """
+    return classify_files(paths, [(include_patterns, exclude_patterns)], exclude_hidden)[0]
+
+
+@zazu.profiler.profiled('classify files')
+def classify_files(paths, patterns, exclude_hidden=False):
+    """List the files that match each of several sets of patterns in a single pass over a list of relative file paths.
+
+    Args:
+        paths (list of str): file paths relative to the base path, e.g. from "git ls-files".
+        patterns (list of tuple): (include_patterns, exclude_patterns) pairs, see scantree.
+        exclude_hidden (bool): don't include hidden files if True.
+
+    Returns:
+        list of list of str: for each pair of patterns, the file paths that match it.
+
+    """
+    matchers = [PathMatcher(i, e, exclude_hidden) for i, e in patterns]
+    results = [[] for m in matchers]
+    pruned = [{} for m in matchers]
+    for path in paths:
+        file = os.path.normpath(path)
+        parts = file.split(os.sep)
+        if exclude_hidden and parts[-1][0] == '.':
+            continue
+        dirs = [os.sep.join(parts[:i]) for i in builtins.range(1, len(parts))]
+        for m, matcher in enumerate(matchers):
+            if not any(_is_pruned(matcher, pruned[m], d) for d in dirs) and matcher.match_file(file):
+                results[m].append(file)
+    return results
+
+
+def _is_pruned(matcher, pruned, path):
+    """Memoized PathMatcher.prune_dir, since the same directories are seen over and over in a list of files."""
+    try:
+        return pruned[path]
+    except KeyError:
+        pruned[path] = matcher.prune_dir(path)
+        return pruned[path]
 
 
 def pprint_list(data):
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""Watch a working tree for files that are added or modified."""
+import zazu.style_cache
+import zazu.util
+zazu.util.lazy_import(locals(), [
+    'os',
+    'threading',
+    'time'
+])
+
+__author__ = "Nicholas Wiles"
+__copyright__ = "Copyright 2017"
+
+
+def watchdog_observer(root, on_change):
+    """Start a watchdog observer that calls on_change with the path of each file event under root.
+
+    Returns:
+        the started observer, or None if watchdog isn't installed or can't watch root.
+    """
+    try:
+        import watchdog.events
+        import watchdog.observers
+    except ImportError:
+        return None
+
+    class Handler(watchdog.events.FileSystemEventHandler):
+
+        def on_any_event(self, event):
+            if not event.is_directory:
+                on_change(event.src_path)
+                dest_path = getattr(event, 'dest_path', None)
+                if dest_path:
+                    on_change(dest_path)
+
+    observer = watchdog.observers.Observer()
+    try:
+        observer.schedule(Handler(), root, recursive=True)
+        observer.start()
+    except (OSError, RuntimeError):
+        return None
+    return observer
+
+
+class TreeWatcher(object):
+    """Find the files matching several sets of patterns that have been added or modified since they were last listed.
+
+    Changes are detected by comparing the stat of each file, so touching a file counts as modifying it. Where the watchdog
+    package is installed it is notified of file events and only the files that had events are checked, otherwise the
+    whole tree is scanned every interval.
+    """
+
+    def __init__(self, root, patterns, interval=1.0, use_watchdog=True):
+        """Constructor, lists the files as they are now.
+
+        Args:
+            root (str): the root of the tree to watch.
+            patterns (list of tuple): (include_patterns, exclude_patterns) pairs, see zazu.util.classify_tree.
+            interval (float): the seconds between scans, or the longest time events are collected before they are
+                checked when watchdog is used.
+            use_watchdog (bool): use watchdog if it is installed.
+        """
+        self._root = root
+        self._patterns = patterns
+        self._interval = interval
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        self._events = set()
+        self._stats = [self._stat_files(files) for files in self._classify_tree()]
+        self._observer = watchdog_observer(root, self._on_change) if use_watchdog else None
+
+    def _on_change(self, path):
+        with self._lock:
+            self._events.add(path)
+        self._event.set()
+
+    def _classify_tree(self):
+        return zazu.util.classify_tree(self._root, self._patterns, exclude_hidden=True)
+
+    def _stat_files(self, files):
+        stats = {}
+        for f in files:
+            try:
+                stats[f] = zazu.style_cache.stat_key(os.stat(os.path.join(self._root, f)))
+            except OSError:
+                pass
+        return stats
+
+    def close(self):
+        """Stop watching."""
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+            self._observer = None
+
+    def poll(self):
+        """Return the files added, modified or removed since they were last listed.
+
+        Returns:
+            list of tuple: for each pair of patterns, the sorted lists of the changed and of the removed file paths relative
+                to the root. A file that is renamed is removed from its old path and changed at its new one.
+
+        """
+        if self._observer is None:
+            candidates = self._classify_tree()
+        else:
+            with self._lock:
+                paths, self._events = self._events, set()
+                self._event.clear()
+            paths = [os.path.relpath(p, self._root) for p in paths]
+            candidates = zazu.util.classify_files([p for p in paths if not p.startswith(os.pardir)], self._patterns,
+                                                  exclude_hidden=True)
+        changes = []
+        for stats, files in zip(self._stats, candidates):
+            current = self._stat_files(files)
+            changed = sorted(f for f, key in current.items() if stats.get(f) != key)
+            if self._observer is None:
+                # Files that disappeared from the scan have been deleted.
+                removed = sorted(f for f in stats if f not in current)
+                stats.clear()
+            else:
+                removed = sorted(f for f in files if f in stats and f not in current)
+                for f in files:
+                    stats.pop(f, None)
+            stats.update(current)
+            changes.append((changed, removed))
+        return changes
+
+    def changes(self):
+        """Generate the changed and removed files each time some have changed or been removed, see poll.
+
+        Waits for at least one interval between polls.
+        """
+        while True:
+            if self._observer is None:
+                time.sleep(self._interval)
+            else:
+                self._event.wait(self._interval)
+            changes = self.poll()
+            if any(changed or removed for changed, removed in changes):
+                yield changes